@@ -1,17 +1,53 @@
-from fastapi import APIRouter
-from app.models import ChatRequest
+import asyncio
+import json
+import math
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from fastapi import APIRouter, Header, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.models import ChatRequest, BatchChatRequest, NearestBatchRequest, StructuredQuery
 from services.data_loader import load_data
-from services.query_engine import parse_prompt, filter_data
-from services.visualizer import temperature_depth_plot, generate_heatmap, generate_probability_distribution
-from services.ai_engine import summarize, train_model, load_model, analyze_anomalies, get_location_insights, calculate_probabilities
+from services.query_engine import parse_prompt, filter_data, filter_batch, query_predicates, plan_query, compile_query, describe_query, aggregate
+from services.query_planner import query_planner
+from services.visualizer import CHART_FORMATS
+from services.ai_engine import summarize, train_model, load_model, analyze_anomalies, get_location_insights, calculate_probabilities, predict_temperature, predict_temperatures
 from services.conversation import conversation_manager
-from services.tsunami_predictor import generate_tsunami_analysis
+from services.tsunami_predictor import generate_tsunami_analysis, train_tsunami_model, load_tsunami_model
 from services.intelligent_responder import generate_intelligent_response, classify_query_intent
 from services.external_ai import is_oceanographic_query, get_fallback_response
+from services.regions import region_registry
+from services.profiles import profile_index
+from services.derived import derived_columns
+from services.standard_levels import standard_levels, nearest_level, STANDARD_LEVELS
+from services.sample_pyramid import sample_pyramid
+from services.nearest import nearest_observations, MAX_NEIGHBOURS
+from services.single_flight import single_flight, normalize_prompt
+from services.derived import depth_to_pressure
+from services.time_index import time_index
+from services.quantile_sketch import quantile_sketches
+from services.result_cache import result_cache
+from services.admission import admission, Overloaded
+from services.offload import offload, OffloadTimeout, tsunami_task, train_task
 
 router = APIRouter()
 
+BATCH_WORKERS = 4
+HISTORY_PAGE_SIZE = 20
+COMPACT_MEDIA_TYPE = "application/vnd.floatchat.compact+json"
+
 df = load_data()
+region_registry.label(df)
+profile_index.build(df)
+derived_columns.attach(df)
+standard_levels.build(df)
+sample_pyramid.build(df)
+query_planner.build(df)
+nearest_observations.build(df)
+time_index.build(df)
+quantile_sketches.build(df)
 
 
 if not load_model() and not df.empty:
@@ -19,64 +55,86 @@ if not load_model() and not df.empty:
     if train_result:
         print(f"✅ AI Model trained: R² = {train_result['r2_score']}, Samples = {train_result['samples']}")
 
-@router.post("/chat")
-def chat(request: ChatRequest):
-    session_id = request.session_id
-    conversation_manager.add_message(session_id, "user", request.prompt)
-    
-    # Check if user wants visualizations
-    show_visualizations = any(word in request.prompt.lower() for word in ["graph", "chart", "plot", "heatmap", "map", "visualize", "show"])
-    
-    if not is_oceanographic_query(request.prompt):
-        fallback_response = get_fallback_response(request.prompt)
-        conversation_manager.add_message(session_id, "assistant", fallback_response)
+if not load_tsunami_model() and not df.empty:
+    tsunami_result = train_tsunami_model(df)
+    if tsunami_result:
+        print(f"✅ Tsunami model trained: held-out accuracy = {tsunami_result['test_accuracy']} (majority class {tsunami_result['majority_accuracy']}), Cells = {tsunami_result['cells']}")
+
+# Workers load the models above, so the pool starts after them
+if offload.start(df):
+    print(f"✅ Offload pool ready: {offload.workers} workers")
+
+# Intents generate_intelligent_response answers with a few column reductions and no charts
+INTELLIGENT_INTENTS = ["pressure", "glacier_ice", "marine_life", "climate", "salinity", "currents"]
+
+VISUALIZATION_WORDS = ["graph", "chart", "plot", "heatmap", "map", "visualize", "show"]
+
+def wants_visualizations(prompt):
+    return any(word in prompt.lower() for word in VISUALIZATION_WORDS)
+
+def negotiate_chart_format(chart_format=None, accept=None):
+    """Explicit ?chart_format= wins, then an Accept header naming the compact media type"""
+    if chart_format in CHART_FORMATS:
+        return chart_format
+    if accept and COMPACT_MEDIA_TYPE in accept:
+        return "compact"
+    return "plotly"
+
+def history_fields(session_id, cursor=None):
+    """History for a response: the last messages, or only those after the client's cursor"""
+    if cursor is None:
+        history = conversation_manager.get_history(session_id)
+    else:
+        history = conversation_manager.get_since(session_id, cursor)
+    return {
+        "conversation_history": history,
+        "history_cursor": conversation_manager.last_id(session_id)
+    }
+
+def answer_special(prompt):
+    """Answer external, tsunami and intelligent-responder prompts; None for general data queries"""
+    if not is_oceanographic_query(prompt):
+        fallback_response = get_fallback_response(prompt)
         return {
             "summary": fallback_response,
-            "query_type": "external",
-            "conversation_history": conversation_manager.get_history(session_id)
+            "query_type": "external"
         }
     
-    intent = classify_query_intent(request.prompt)
+    intent = classify_query_intent(prompt)
     
     if intent == "tsunami":
-        tsunami_analysis = generate_tsunami_analysis(df, request.prompt)
-        conversation_manager.add_message(session_id, "assistant", tsunami_analysis["summary"])
-        
+        try:
+            tsunami_analysis = offload.run("analysis", tsunami_task, (prompt, "model"), lambda: generate_tsunami_analysis(df, prompt))
+        except OffloadTimeout:
+            return {
+                "summary": "Tsunami risk analysis is taking longer than expected. Please try again in a moment.",
+                "query_type": "tsunami"
+            }
         return {
             "summary": tsunami_analysis["summary"],
             "tsunami_risks": tsunami_analysis["top_risks"],
             "all_regions": tsunami_analysis["all_regions"],
             "recommendations": tsunami_analysis["recommendations"],
-            "query_type": "tsunami",
-            "conversation_history": conversation_manager.get_history(session_id)
+            "query_type": "tsunami"
         }
     
-    intelligent_response = generate_intelligent_response(request.prompt, df)
+    intelligent_response = generate_intelligent_response(prompt, df)
     if intelligent_response:
-        conversation_manager.add_message(session_id, "assistant", intelligent_response)
         return {
             "summary": intelligent_response,
-            "query_type": "intelligent",
-            "conversation_history": conversation_manager.get_history(session_id)
+            "query_type": "intelligent"
         }
     
-    query = parse_prompt(request.prompt)
+    return None
+
+def select_data(query):
+    """Filter a parsed general query; stats is None when nothing matches"""
     filtered_df = filter_data(df, query)
+    return filtered_df, compute_stats(query, filtered_df)
 
+def compute_stats(query, filtered_df):
     if filtered_df.empty:
-        response_text = "No ARGO data available for this query. Try asking about temperature, salinity, pressure, marine life, glaciers, or climate change."
-        conversation_manager.add_message(session_id, "assistant", response_text)
-        return {
-            "summary": response_text,
-            "chart": None,
-            "heatmap": None,
-            "probabilities": {},
-            "issues": [],
-            "location_insights": "No data available.",
-            "query_type": "general",
-            "show_visualizations": False,
-            "conversation_history": conversation_manager.get_history(session_id)
-        }
+        return None
 
     variable = query["variable"]
 
@@ -92,41 +150,639 @@ def chat(request: ChatRequest):
         "data_points": int(len(filtered_df)),
         "total_records": len(df)
     }
+    return stats
 
-    ai_summary = summarize(request.prompt, stats)
+def no_data_response():
+    response_text = "No ARGO data available for this query. Try asking about temperature, salinity, pressure, marine life, glaciers, or climate change."
+    return {
+        "summary": response_text,
+        "chart": None,
+        "heatmap": None,
+        "probabilities": {},
+        "issues": [],
+        "location_insights": "No data available.",
+        "query_type": "general",
+        "show_visualizations": False
+    }
+
+def analysis_blocks(query, filtered_df, show_visualizations, exact_percentiles=False, chart_format="plotly"):
+    """Independent analysis steps of a general answer, keyed by response field.
+
+    Each takes the probabilities result (only the distribution chart uses it,
+    to reuse the median), so callers must run "probabilities" first.
+    """
+    variable = query["variable"]
+    blocks = {
+        "probabilities": lambda probabilities: calculate_probabilities(filtered_df, variable, query, exact=exact_percentiles),
+        "issues": lambda probabilities: analyze_anomalies(filtered_df, variable),
+        "location_insights": lambda probabilities: get_location_insights(filtered_df, query),
+        "time_series": lambda probabilities: time_index.rollup(query["region"], query["time_rollup"], query["start_time"], query["end_time"]) if query["time_rollup"] else None
+    }
+    if show_visualizations:
+        for field in CHART_FIELDS:
+            blocks[field] = lambda probabilities, field=field: offload.charts({field: chart_call(field, query, filtered_df, probabilities, chart_format)})[field]
+    return blocks
+
+CHART_FIELDS = ["chart", "heatmap", "probability_distribution"]
+
+def chart_call(field, query, filtered_df, probabilities, chart_format="plotly"):
+    """Visualizer chart name and arguments for one response field; only the distribution reads probabilities"""
+    variable = query["variable"]
+    if field == "chart":
+        return "temperature_depth_plot", (filtered_df, chart_format)
+    if field == "heatmap":
+        return "generate_heatmap", (filtered_df, variable, chart_format)
+    return "generate_probability_distribution", (filtered_df, variable, probabilities.get("median"), chart_format)
+
+def chart_calls(query, filtered_df, probabilities, chart_format="plotly"):
+    """chart_call for every chart field, for the offload pool"""
+    return {field: chart_call(field, query, filtered_df, probabilities, chart_format) for field in CHART_FIELDS}
+
+@router.post("/chat")
+async def chat(request: ChatRequest, chart_format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    chart_format = negotiate_chart_format(chart_format, accept)
+    # A duplicate of an in-flight request awaits that computation on the event loop instead of taking an admission slot
+    response = await follow_flight(request, chart_format)
+    if response is not None:
+        return response
     
-    # Generate visualizations only if requested
-    chart_json = temperature_depth_plot(filtered_df) if show_visualizations else None
-    heatmap_json = generate_heatmap(filtered_df, variable) if show_visualizations else None
-    prob_dist_json = generate_probability_distribution(filtered_df, variable) if show_visualizations else None
+    # Admission waits on the event loop; only admitted requests take a threadpool thread
+    cost_class = request_cost_class(request.prompt)
+    try:
+        # Chart requests don't queue: over budget they degrade at once
+        async with admission.admit(cost_class, wait=cost_class != "visualization"):
+            return await run_in_threadpool(answer_chat, request, chart_format)
+    except Overloaded as overloaded:
+        if overloaded.cost_class != "visualization":
+            return shed_response(overloaded)
     
-    anomalies = analyze_anomalies(filtered_df, variable)
-    location_insights = get_location_insights(filtered_df, query)
-    probabilities = calculate_probabilities(filtered_df, variable)
+    # Degrade over-budget chart requests to a text-and-stats answer
+    try:
+        async with admission.admit("analysis"):
+            response = await run_in_threadpool(answer_chat, request, chart_format, allow_visualizations=False)
+    except Overloaded as overloaded:
+        return shed_response(overloaded)
+    response["degraded"] = True
+    return response
 
+def request_cost_class(prompt):
+    """Admission class of a prompt, decided from keywords before any data work"""
+    if not is_oceanographic_query(prompt):
+        return "external_ai"
+    intent = classify_query_intent(prompt)
+    if intent in INTELLIGENT_INTENTS:
+        return "cheap"
+    if intent != "tsunami" and wants_visualizations(prompt):
+        return "visualization"
+    return "analysis"
+
+def special_key(prompt):
+    return ("special", df.attrs.get("generation"), normalize_prompt(prompt))
+
+def answer_special_once(prompt):
+    """answer_special, computed once for concurrent identical prompts; each caller gets its own copy"""
+    response = single_flight.do(special_key(prompt), answer_special, prompt)
+    return dict(response) if response is not None else None
+
+async def follow_flight(request, chart_format):
+    """The response from an identical request's in-flight computation, or None when there is none to join.
+
+    Followers hold neither an admission slot nor a thread; a request that
+    finds nothing to join goes through admission and computes as usual.
+    """
+    special = single_flight.follow(special_key(request.prompt))
+    if special is not None:
+        response = await special
+        if response is not None:
+            conversation_manager.add_message(request.session_id, "user", request.prompt)
+            return special_chat_response(request, dict(response))
+    
+    # A general prompt's leader may have moved on to the data query
+    show_visualizations = wants_visualizations(request.prompt)
+    key = result_key(parse_prompt(request.prompt), show_visualizations, request.exact_percentiles, chart_format)
+    general = single_flight.follow(("general",) + key)
+    if general is None:
+        return None
+    stats, results = await general
+    conversation_manager.add_message(request.session_id, "user", request.prompt)
+    return general_chat_response(request, stats, results, show_visualizations)
+
+def shed_response(overloaded):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(overloaded.retry_after))},
+        content={
+            "summary": "FloatChat is busy with similar requests right now. Please try again in a moment.",
+            "query_type": "shed",
+            "cost_class": overloaded.cost_class,
+            "retry_after": overloaded.retry_after
+        }
+    )
+
+def answer_chat(request: ChatRequest, chart_format="plotly", allow_visualizations=True):
+    conversation_manager.add_message(request.session_id, "user", request.prompt)
+    
+    response = answer_special_once(request.prompt)
+    if response is not None:
+        return special_chat_response(request, response)
+    
+    # Check if user wants visualizations
+    show_visualizations = allow_visualizations and wants_visualizations(request.prompt)
+    
+    stats, results = analyze_general(request.prompt, show_visualizations, request.exact_percentiles, chart_format)
+    return general_chat_response(request, stats, results, show_visualizations)
+
+def special_chat_response(request: ChatRequest, response):
+    conversation_manager.add_message(request.session_id, "assistant", response["summary"])
+    response.update(history_fields(request.session_id, request.history_cursor))
+    return response
+
+def general_chat_response(request: ChatRequest, stats, results, show_visualizations):
+    """The /chat answer for computed general results: summary, analysis and history, no data work"""
+    session_id = request.session_id
+    if stats is None:
+        response = no_data_response()
+        conversation_manager.add_message(session_id, "assistant", response["summary"])
+        response.update(history_fields(session_id, request.history_cursor))
+        return response
+
+    ai_summary = summarize(request.prompt, stats)
     conversation_manager.add_message(session_id, "assistant", ai_summary, metadata=stats)
+    
+    response = general_response(ai_summary, stats, results, show_visualizations)
+    response.update(history_fields(session_id, request.history_cursor))
+    return response
+
+def result_key(query, show_visualizations, exact_percentiles=False, chart_format="plotly"):
+    """Cache key: the normalized query plus the dataset generation"""
+    return (
+        df.attrs.get("generation"),
+        query_predicates(query),
+        query["variable"],
+        query["time_rollup"],
+        show_visualizations,
+        bool(exact_percentiles),
+        chart_format if show_visualizations else None
+    )
+
+def analyze_general(prompt, show_visualizations, exact_percentiles=False, chart_format="plotly"):
+    """(stats, results) for a general query, from the result cache when possible"""
+    query = parse_prompt(prompt)
+    key = result_key(query, show_visualizations, exact_percentiles, chart_format)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    # Concurrent misses for the same key share one computation
+    return single_flight.do(("general",) + key, compute_general, query, key, show_visualizations, exact_percentiles, chart_format)
+
+def compute_general(query, key, show_visualizations, exact_percentiles=False, chart_format="plotly"):
+    filtered_df, stats = select_data(query)
+    results = run_analysis(query, filtered_df, show_visualizations, exact_percentiles, chart_format) if stats is not None else None
+    result_cache.put(key, (stats, results))
+    return stats, results
 
+def run_analysis(query, filtered_df, show_visualizations, exact_percentiles=False, chart_format="plotly"):
+    blocks = analysis_blocks(query, filtered_df, False, exact_percentiles, chart_format)
+    probabilities = blocks.pop("probabilities")(None)
+    # Charts go to the offload pool together and build while the other blocks run here
+    charts = chart_calls(query, filtered_df, probabilities, chart_format) if show_visualizations else {}
+    submitted = offload.submit_charts(charts)
+    results = {name: block(probabilities) for name, block in blocks.items()}
+    results.update(offload.chart_results(charts, submitted))
+    results["probabilities"] = probabilities
+    return results
+
+def general_response(ai_summary, stats, results, show_visualizations):
     return {
         "summary": ai_summary,
         "stats": stats,
-        "chart": chart_json,
-        "heatmap": heatmap_json,
-        "probability_distribution": prob_dist_json,
-        "probabilities": probabilities,
-        "issues": anomalies,
-        "location_insights": location_insights,
+        "chart": results.get("chart"),
+        "heatmap": results.get("heatmap"),
+        "probability_distribution": results.get("probability_distribution"),
+        "probabilities": results["probabilities"],
+        "issues": results["issues"],
+        "location_insights": results["location_insights"],
+        "time_series": results["time_series"],
         "query_type": "general",
-        "show_visualizations": show_visualizations,
-        "conversation_history": conversation_manager.get_history(session_id)
+        "show_visualizations": show_visualizations
+    }
+
+def stream_event(event, **fields):
+    return json.dumps(jsonable_encoder({"event": event, **fields})) + "\n"
+
+async def stream_chat(request: ChatRequest, chart_format="plotly"):
+    """NDJSON events: summary first, then each analysis block as it finishes, then done"""
+    session_id = request.session_id
+    conversation_manager.add_message(session_id, "user", request.prompt)
+    
+    response = await run_in_threadpool(answer_special_once, request.prompt)
+    if response is None:
+        show_visualizations = wants_visualizations(request.prompt)
+        query = parse_prompt(request.prompt)
+        key = result_key(query, show_visualizations, request.exact_percentiles, chart_format)
+        cached = result_cache.get(key)
+        if cached is not None:
+            stats, results = cached
+        else:
+            filtered_df, stats = await run_in_threadpool(select_data, query)
+            results = None
+            if stats is None:
+                result_cache.put(key, (None, None))
+        if stats is None:
+            response = no_data_response()
+    
+    if response is not None:
+        conversation_manager.add_message(session_id, "assistant", response["summary"])
+        yield stream_event("summary", **response)
+        yield stream_event("done", **history_fields(session_id, request.history_cursor))
+        return
+    
+    ai_summary = summarize(request.prompt, stats)
+    conversation_manager.add_message(session_id, "assistant", ai_summary, metadata=stats)
+    yield stream_event("summary", summary=ai_summary, stats=stats, query_type="general", show_visualizations=show_visualizations)
+    
+    if results is not None:
+        for name, value in results.items():
+            yield stream_event(name, data=value)
+        yield stream_event("done", **history_fields(session_id, request.history_cursor))
+        return
+    
+    blocks = analysis_blocks(query, filtered_df, show_visualizations, request.exact_percentiles, chart_format)
+    probabilities_task = asyncio.create_task(run_in_threadpool(blocks.pop("probabilities"), None))
+    
+    async def run_block(name, block):
+        if name == "probability_distribution":
+            return await run_in_threadpool(block, await probabilities_task)
+        return await run_in_threadpool(block, None)
+    
+    tasks = {probabilities_task: "probabilities"}
+    tasks.update({asyncio.create_task(run_block(name, block)): name for name, block in blocks.items()})
+    results = {}
+    try:
+        pending = set(tasks)
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                name = tasks[task]
+                try:
+                    value = task.result()
+                except Exception as e:
+                    # A failed block ends the stream; partial results are not cached
+                    print(f"Stream block {name} failed: {e}")
+                    yield stream_event("error", block=name, message=f"Could not compute {name}.")
+                    yield stream_event("done", **history_fields(session_id, request.history_cursor))
+                    return
+                results[name] = value
+                yield stream_event(name, data=value)
+    finally:
+        # After a failure or a client disconnect, stop the blocks still running
+        for task in tasks:
+            if not task.cancel() and not task.cancelled():
+                task.exception()
+    result_cache.put(key, (stats, results))
+    
+    yield stream_event("done", **history_fields(session_id, request.history_cursor))
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, chart_format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    """Streaming variant of /chat as newline-delimited JSON events"""
+    cost_class = request_cost_class(request.prompt)
+    try:
+        await admission.acquire(cost_class)
+    except Overloaded as overloaded:
+        return shed_response(overloaded)
+    
+    async def admitted_stream():
+        try:
+            async for event in stream_chat(request, negotiate_chart_format(chart_format, accept)):
+                yield event
+        finally:
+            admission.release(cost_class)
+    
+    return StreamingResponse(admitted_stream(), media_type="application/x-ndjson")
+
+@router.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest, chart_format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    """Answer many prompts together, planning their data selections jointly"""
+    cost_class = "visualization" if any(wants_visualizations(prompt) for prompt in request.prompts) else "analysis"
+    try:
+        async with admission.admit(cost_class):
+            return await run_in_threadpool(answer_batch, request, chart_format, accept)
+    except Overloaded as overloaded:
+        return shed_response(overloaded)
+
+def answer_batch(request: BatchChatRequest, chart_format=None, accept=None):
+    session_id = request.session_id
+    prompts = request.prompts
+    chart_format = negotiate_chart_format(chart_format, accept)
+    
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        # Identical prompts are answered once
+        distinct_prompts = list(dict.fromkeys(prompts))
+        special = dict(zip(distinct_prompts, pool.map(answer_special_once, distinct_prompts)))
+        
+        # Cached results first; only the misses are planned against the data
+        computed = {}
+        pending = {}
+        prompt_keys = {}
+        for prompt in distinct_prompts:
+            if special[prompt] is not None:
+                continue
+            query = parse_prompt(prompt)
+            key = prompt_keys[prompt] = result_key(query, wants_visualizations(prompt), request.exact_percentiles, chart_format)
+            cached = result_cache.get(key)
+            if cached is not None:
+                computed[key] = cached
+            elif key not in pending:
+                pending[key] = query
+        
+        # Prompts that normalize to the same selection, variable and charts share one analysis
+        keys = list(pending)
+        analyses = {}
+        for key, filtered_df in zip(keys, filter_batch(df, [pending[key] for key in keys])):
+            stats = compute_stats(pending[key], filtered_df)
+            show_visualizations = key[4]
+            analysis = pool.submit(run_analysis, pending[key], filtered_df, show_visualizations, request.exact_percentiles, chart_format) if stats is not None else None
+            analyses[key] = (stats, analysis)
+        for key, (stats, analysis) in analyses.items():
+            computed[key] = (stats, analysis.result() if analysis is not None else None)
+            result_cache.put(key, computed[key])
+        
+        answers = dict(special)
+        for prompt, key in prompt_keys.items():
+            stats, results = computed[key]
+            if stats is None:
+                answers[prompt] = no_data_response()
+            else:
+                answers[prompt] = general_response(summarize(prompt, stats), stats, results, key[4])
+    
+    results = []
+    for prompt in prompts:
+        answer = answers[prompt]
+        conversation_manager.add_message(session_id, "user", prompt)
+        conversation_manager.add_message(session_id, "assistant", answer["summary"], metadata=answer.get("stats"))
+        results.append({"prompt": prompt, **answer})
+    
+    return {
+        "results": results,
+        **history_fields(session_id, request.history_cursor)
+    }
+
+@router.get("/history/{session_id}")
+def history(session_id: str, cursor: int = 0, limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=100)):
+    """Page through a session's messages oldest first; pass next_cursor to continue"""
+    messages = conversation_manager.get_since(session_id, cursor, limit)
+    next_cursor = messages[-1]["id"] if messages else cursor
+    return {
+        "messages": messages,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor < conversation_manager.last_id(session_id)
+    }
+
+@router.get("/cache/stats")
+def cache_stats():
+    """Hit-rate and size metrics of the query result cache"""
+    return result_cache.stats()
+
+@router.post("/query")
+async def structured_query(request: StructuredQuery):
+    """Filter with explicit predicates and aggregate; the plan lists predicate order, access path and row counts"""
+    columns = request.variables + [condition.variable for condition in request.conditions]
+    unknown = [column for column in columns if not derived_columns.supports(df, column)]
+    if unknown:
+        return {"status": "error", "message": f"Unknown variables: {unknown}"}
+    try:
+        query = compile_query(request.model_dump())
+    except ValueError as error:
+        return {"status": "error", "message": str(error)}
+    
+    try:
+        async with admission.admit("analysis"):
+            filtered_df, plan, results = await run_in_threadpool(run_structured_query, query, request)
+    except Overloaded as overloaded:
+        return shed_response(overloaded)
+    
+    structured = describe_query(query)
+    structured.update(variables=request.variables, aggregations=request.aggregations, group_by=request.group_by)
+    return {
+        "query": structured,
+        "rows": int(len(filtered_df)),
+        "plan": plan,
+        "results": results
+    }
+
+def run_structured_query(query, request: StructuredQuery):
+    derived_columns.ensure(request.variables)
+    filtered_df, plan = plan_query(df, query)
+    return filtered_df, plan, aggregate(filtered_df, request.variables, request.aggregations, request.group_by)
+
+@router.get("/query/compile")
+def compile_prompt(prompt: str):
+    """The structured query a chat prompt compiles into, ready to edit and POST to /query"""
+    query = parse_prompt(prompt)
+    if query["query_type"] != "general":
+        return {"status": "error", "message": f"'{query['query_type']}' prompts are not data queries"}
+    return {"query": describe_query(query)}
+
+@router.get("/coalescing/stats")
+def coalescing_stats():
+    """How many requests joined an identical in-flight computation instead of starting their own"""
+    return single_flight.stats()
+
+@router.get("/tsunami")
+async def tsunami(method: str = "model"):
+    """Regional tsunami risk; method=threshold gives the rule-based baseline for comparison"""
+    if method not in ("model", "threshold"):
+        return {"status": "error", "message": "method must be 'model' or 'threshold'"}
+    try:
+        return await offload.run_async("analysis", tsunami_task, ("", method), lambda: generate_tsunami_analysis(df, "", method))
+    except OffloadTimeout as timeout:
+        return {"status": "error", "message": str(timeout)}
+
+def level_profiles(variable, region=None, start=None, end=None):
+    """Profiles of the standard-level product matching the filters, or an error response"""
+    if not standard_levels.ready:
+        return None, {"status": "error", "message": "Standard-level product unavailable for this dataset"}
+    if variable not in standard_levels.grids:
+        return None, {"status": "error", "message": f"variable must be one of {list(standard_levels.grids)}"}
+    region_info = region_registry.get(region) if region else None
+    if region and region_info is None:
+        return None, {"status": "error", "message": f"Unknown region: {region}"}
+    try:
+        return standard_levels.select(region_info, start, end), None
+    except (ValueError, TypeError):
+        return None, {"status": "error", "message": "start and end must be ISO dates"}
+
+def level_values(values):
+    """Rounded values with NaN (profile does not reach the level) as null"""
+    values = np.round(values, 3).astype(object)
+    values[np.isnan(values.astype(float))] = None
+    return values.tolist()
+
+def profile_positions(profiles):
+    positions = standard_levels.profiles.iloc[profiles]
+    return {
+        "latitude": positions["latitude"].round(3).tolist(),
+        "longitude": positions["longitude"].round(3).tolist(),
+        "time": positions["time"].astype(str).tolist() if "time" in positions.columns else None
+    }
+
+def point_pressure(latitude, depth=None, pressure=None):
+    """Requested pressure in dbar, converting a depth in meters at the point's latitude"""
+    if pressure is not None:
+        return pressure
+    if depth is not None:
+        return round(float(depth_to_pressure(depth, latitude)), 1)
+    return None
+
+def point_answer(latitude, longitude, pressure, observations, prediction):
+    return {
+        "query": {"latitude": latitude, "longitude": longitude, "pressure": pressure},
+        "observations": observations,
+        "predicted_temperature": prediction
+    }
+
+@router.get("/nearest")
+def nearest(latitude: float = Query(..., ge=-90, le=90), longitude: float = Query(..., ge=-180, le=180),
+            depth: Optional[float] = Query(None, ge=0), pressure: Optional[float] = Query(None, ge=0),
+            k: int = Query(5, ge=1, le=MAX_NEIGHBOURS)):
+    """The k nearest real observations to a point (closest sample in pressure per profile) next to the model prediction"""
+    if not nearest_observations.ready:
+        return {"status": "error", "message": "No observations available"}
+    
+    pressure = point_pressure(latitude, depth, pressure)
+    observations = nearest_observations.k_nearest([latitude], [longitude], [pressure], k)[0]
+    return point_answer(latitude, longitude, pressure, observations, predict_temperature(latitude, longitude, pressure or 0))
+
+@router.get("/nearby")
+def nearby(latitude: float = Query(..., ge=-90, le=90), longitude: float = Query(..., ge=-180, le=180),
+           radius_km: float = Query(100, gt=0, le=2000), depth: Optional[float] = Query(None, ge=0),
+           pressure: Optional[float] = Query(None, ge=0), limit: int = Query(50, ge=1, le=MAX_NEIGHBOURS)):
+    """Observations from every profile within radius_km of a point, nearest first"""
+    if not nearest_observations.ready:
+        return {"status": "error", "message": "No observations available"}
+    
+    pressure = point_pressure(latitude, depth, pressure)
+    observations = nearest_observations.within_radius([latitude], [longitude], radius_km, [pressure], limit)[0]
+    return point_answer(latitude, longitude, pressure, observations, predict_temperature(latitude, longitude, pressure or 0))
+
+@router.post("/nearest/batch")
+def nearest_batch(request: NearestBatchRequest):
+    """/nearest for many points in one tree query and one model call; with radius_km, up to k observations within it"""
+    if not nearest_observations.ready:
+        return {"status": "error", "message": "No observations available"}
+    
+    latitudes = [point.latitude for point in request.points]
+    longitudes = [point.longitude for point in request.points]
+    pressures = [point_pressure(point.latitude, point.depth, point.pressure) for point in request.points]
+    if request.radius_km is not None:
+        observations = nearest_observations.within_radius(latitudes, longitudes, request.radius_km, pressures, request.k)
+    else:
+        observations = nearest_observations.k_nearest(latitudes, longitudes, pressures, request.k)
+    predictions = predict_temperatures(latitudes, longitudes, [pressure or 0 for pressure in pressures]) or [None] * len(latitudes)
+    return {
+        "results": [
+            point_answer(*point, found, prediction)
+            for point, found, prediction in zip(zip(latitudes, longitudes, pressures), observations, predictions)
+        ]
+    }
+
+@router.get("/levels")
+def levels():
+    """Standard pressure levels (dbar) and variables of the interpolated product"""
+    return {
+        "levels": STANDARD_LEVELS.tolist(),
+        "variables": list(standard_levels.grids),
+        "profiles": len(standard_levels.profiles) if standard_levels.ready else 0
+    }
+
+@router.get("/levels/slice")
+def level_slice(variable: str = "temperature", depth: Optional[float] = None, pressure: Optional[float] = None,
+                region: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+    """Every matching profile's value at the standard level nearest a depth (m) or pressure (dbar)"""
+    if (depth is None) == (pressure is None):
+        return {"status": "error", "message": "Pass exactly one of depth (m) or pressure (dbar)"}
+    profiles, error = level_profiles(variable, region, start, end)
+    if error:
+        return error
+    
+    level_index = nearest_level(depth, "m") if depth is not None else nearest_level(pressure)
+    values = standard_levels.depth_slice(variable, level_index, profiles)
+    return {
+        "variable": variable,
+        "level": float(STANDARD_LEVELS[level_index]),
+        "values": level_values(values),
+        "mean": round(float(np.nanmean(values)), 3) if np.isfinite(values).any() else None,
+        **profile_positions(profiles)
+    }
+
+@router.get("/levels/section")
+def level_section(variable: str = "temperature", region: Optional[str] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, along: str = "longitude"):
+    """profiles × levels block of matching profiles, ordered along latitude or longitude"""
+    if along not in ("latitude", "longitude"):
+        return {"status": "error", "message": "along must be 'latitude' or 'longitude'"}
+    profiles, error = level_profiles(variable, region, start, end)
+    if error:
+        return error
+    
+    order, block = standard_levels.section(variable, profiles, along)
+    return {
+        "variable": variable,
+        "levels": STANDARD_LEVELS.tolist(),
+        "values": [level_values(row) for row in block],
+        **profile_positions(order)
     }
 
+@router.get("/levels/mean")
+def level_mean(variable: str = "temperature", top: float = 0, bottom: float = 2000, region: Optional[str] = None,
+               start: Optional[str] = None, end: Optional[str] = None):
+    """Thickness-weighted vertical mean between two pressures (dbar) for each matching profile"""
+    if top >= bottom:
+        return {"status": "error", "message": "top must be shallower than bottom"}
+    profiles, error = level_profiles(variable, region, start, end)
+    if error:
+        return error
+    
+    values = standard_levels.vertical_mean(variable, top, bottom, profiles)
+    return {
+        "variable": variable,
+        "top": top,
+        "bottom": bottom,
+        "values": level_values(values),
+        "mean": round(float(np.nanmean(values)), 3) if np.isfinite(values).any() else None,
+        **profile_positions(profiles)
+    }
+
+@router.get("/admission/stats")
+def admission_stats():
+    """Per cost class concurrency, queue depth, shed counts and queue-time percentiles"""
+    return admission.stats()
+
+@router.get("/offload/stats")
+def offload_stats():
+    """Process pool size, task counts, timeouts and cancellations"""
+    return offload.stats()
+
 @router.post("/train")
-def train():
+async def train():
     """Train AI model on ARGO dataset"""
     if df.empty:
         return {"status": "error", "message": "No data available for training"}
     
-    result = train_model(df)
+    try:
+        async with admission.admit("training"):
+            return await train_all()
+    except Overloaded as overloaded:
+        return shed_response(overloaded)
+    except OffloadTimeout as timeout:
+        return {"status": "error", "message": str(timeout)}
+
+async def train_all():
+    result, tsunami_result = await offload.run_async("training", train_task, (), lambda: (train_model(df), train_tsunami_model(df)))
+    # Trained in a worker: reload the saved models here and in the pool
+    await run_in_threadpool(offload.models_changed)
     if result:
-        return {"status": "success", "metrics": result}
+        return {"status": "success", "metrics": result, "tsunami_metrics": tsunami_result}
     return {"status": "error", "message": "Training failed"}
\ No newline at end of file
@@ -1,6 +1,47 @@
-from pydantic import BaseModel
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 class ChatRequest(BaseModel):
     prompt: str
-    session_id: Optional[str] = "default"
\ No newline at end of file
+    session_id: Optional[str] = "default"
+    exact_percentiles: Optional[bool] = False
+    history_cursor: Optional[int] = None
+
+class PointQuery(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    depth: Optional[float] = Field(None, ge=0)
+    pressure: Optional[float] = Field(None, ge=0)
+
+class NearestBatchRequest(BaseModel):
+    points: List[PointQuery] = Field(..., min_length=1, max_length=500)
+    k: int = Field(5, ge=1, le=100)
+    radius_km: Optional[float] = Field(None, gt=0, le=2000)
+
+class QueryCondition(BaseModel):
+    variable: str
+    op: Literal[">", "<"]
+    value: float
+
+class StructuredQuery(BaseModel):
+    variables: List[str] = Field(default=["temperature"], min_length=1, max_length=8)
+    pressure_min: Optional[float] = Field(None, ge=0)
+    pressure_max: Optional[float] = Field(None, ge=0)
+    lat_min: Optional[float] = Field(None, ge=-90, le=90)
+    lat_max: Optional[float] = Field(None, ge=-90, le=90)
+    lon_min: Optional[float] = Field(None, ge=-180, le=180)
+    lon_max: Optional[float] = Field(None, ge=-180, le=180)
+    region: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    level: Optional[float] = Field(None, ge=0)
+    conditions: List[QueryCondition] = Field(default_factory=list, max_length=8)
+    aggregations: List[str] = Field(default=["count", "mean", "min", "max"], min_length=1)
+    group_by: Optional[Literal["month", "year"]] = None
+
+class BatchChatRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=50)
+    session_id: Optional[str] = "default"
+    exact_percentiles: Optional[bool] = False
+    history_cursor: Optional[int] = None
\ No newline at end of file
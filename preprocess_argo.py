@@ -7,6 +7,8 @@ OUTPUT_FILE = "data/argo_clean.parquet"
 CHUNK_SIZE = 500_000                 # safe for low RAM
 
 IMPORTANT_COLS = [
+    "platform_number",                 # float + cycle identify a profile
+    "cycle_number",
     "juld",
     "latitude",
     "longitude",
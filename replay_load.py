@@ -0,0 +1,223 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+# ===== CONFIG =====
+DEFAULT_MIX = "general=5,visualization=2,intelligent=2,tsunami=1,external=1"
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 0.0                   # requests/s, 0 = closed loop (as fast as workers allow)
+REQUEST_TIMEOUT = 60
+IN_PROCESS_PORT = 8799
+
+REGIONS = ["indian ocean", "pacific", "atlantic", "southern ocean", "arctic ocean"]
+VARIABLES = ["temperature", "salinity", "density", "mixed layer depth"]
+TIME_PHRASES = ["", " in 2023", " over the last 5 years", " since 2020"]
+
+# Prompt templates per intent; {region}, {variable} and {time} are filled at random
+INTENT_TEMPLATES = {
+    "general": [
+        "What is the {variable} in the {region}{time}?",
+        "Average deep {variable} in the {region}",
+        "surface {variable} in the {region}{time}",
+        "{variable} at 500 m in the {region}"
+    ],
+    "visualization": [
+        "Show me a plot of {variable} in the {region}",
+        "Visualize {variable} distribution in the {region}{time}",
+        "Graph of surface {variable} in the {region}"
+    ],
+    "intelligent": [
+        "Tell me about water pressure in the {region}",
+        "How is climate change affecting the {region}{time}?",
+        "Is the marine life in the {region} healthy?",
+        "Are glaciers melting near the {region}?"
+    ],
+    "tsunami": [
+        "What is the tsunami risk in the {region}?",
+        "Any flood hazard near the {region}?"
+    ],
+    "external": [
+        "Who won the football world cup?",
+        "Write a haiku about mountains"
+    ]
+}
+
+def parse_mix(mix):
+    """"general=5,tsunami=1" -> {"general": 5.0, "tsunami": 1.0}"""
+    weights = {}
+    for part in mix.split(","):
+        intent, _, weight = part.partition("=")
+        intent = intent.strip()
+        if intent not in INTENT_TEMPLATES:
+            raise ValueError(f"Unknown intent '{intent}', expected one of {list(INTENT_TEMPLATES)}")
+        weights[intent] = float(weight or 1)
+    return weights
+
+def synthesize(n, mix, rate, sessions, seed):
+    """n /chat requests drawn from the intent mix, with Poisson arrival offsets when rate > 0"""
+    rng = random.Random(seed)
+    intents, weights = zip(*parse_mix(mix).items())
+    offset = 0.0
+    log = []
+    for i in range(n):
+        intent = rng.choices(intents, weights)[0]
+        prompt = rng.choice(INTENT_TEMPLATES[intent]).format(
+            region=rng.choice(REGIONS), variable=rng.choice(VARIABLES), time=rng.choice(TIME_PHRASES)
+        )
+        if rate > 0:
+            offset += rng.expovariate(rate)
+        log.append({"prompt": prompt, "session_id": f"load-{rng.randrange(sessions)}", "offset": offset, "intent": intent})
+    return log
+
+def load_log(path, rate, speed, seed):
+    """Recorded requests, one JSON object per line with "prompt" and optionally "session_id" and "offset" (seconds)"""
+    with open(path) as f:
+        log = [json.loads(line) for line in f if line.strip()]
+    log = [entry for entry in log if "prompt" in entry]
+
+    if rate > 0:
+        # Re-time the recording as a Poisson stream at the requested rate
+        rng = random.Random(seed)
+        offset = 0.0
+        for entry in log:
+            offset += rng.expovariate(rate)
+            entry["offset"] = offset
+    elif all("offset" in entry for entry in log):
+        for entry in log:
+            entry["offset"] = entry["offset"] / speed
+    else:
+        for entry in log:
+            entry["offset"] = 0.0
+    return log
+
+def start_in_process_server(port):
+    """Run the app with uvicorn on a background thread of this process; returns its base URL"""
+    import uvicorn
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+class Replayer:
+    """Sends a request log to /chat from a worker pool and records per-request latency.
+
+    With arrival offsets (open loop) latency is measured from each request's
+    scheduled arrival, so time spent waiting for a free worker counts against
+    the server instead of being hidden; without offsets it is closed loop.
+    """
+
+    def __init__(self, base_url, concurrency, chart_format=None):
+        self.url = f"{base_url}/chat" + (f"?chart_format={chart_format}" if chart_format else "")
+        self.concurrency = concurrency
+        self.local = threading.local()
+        self.results = []
+        self.lock = threading.Lock()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def send(self, entry, scheduled=None):
+        scheduled = scheduled or time.perf_counter()
+        payload = {"prompt": entry["prompt"], "session_id": entry.get("session_id", "load")}
+        try:
+            response = self.session().post(self.url, json=payload, timeout=REQUEST_TIMEOUT)
+            body = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            query_type = body.get("query_type") or f"http_{response.status_code}"
+            ok = response.status_code == 200
+            size = len(response.content)
+        except requests.RequestException as error:
+            query_type, ok, size = f"error_{type(error).__name__}", False, 0
+        latency = time.perf_counter() - scheduled
+        with self.lock:
+            self.results.append({"query_type": query_type, "latency": latency, "ok": ok, "bytes": size, "intent": entry.get("intent")})
+
+    def run(self, log):
+        open_loop = any(entry.get("offset", 0.0) > 0 for entry in log)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for entry in log:
+                scheduled = start + entry.get("offset", 0.0)
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, entry, scheduled if open_loop else None)
+        return time.perf_counter() - start
+
+def summarize_latencies(results, elapsed):
+    latencies = np.array([result["latency"] for result in results]) * 1000
+    return {
+        "requests": len(results),
+        "errors": sum(not result["ok"] for result in results),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_bytes": int(np.mean([result["bytes"] for result in results])) if results else 0,
+        **{f"p{q}_ms": round(float(np.percentile(latencies, q)), 1) if len(latencies) else 0.0 for q in (50, 95, 99)}
+    }
+
+def build_report(results, elapsed):
+    by_type = defaultdict(list)
+    for result in results:
+        by_type[result["query_type"]].append(result)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "overall": summarize_latencies(results, elapsed),
+        "by_query_type": {query_type: summarize_latencies(group, elapsed) for query_type, group in sorted(by_type.items())}
+    }
+
+def print_report(report):
+    header = f"{'query_type':<16}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["by_query_type"].items()) + [("overall", report["overall"])]
+    for query_type, stats in rows:
+        print(f"{query_type:<16}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>9}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print(f"\nElapsed: {report['elapsed_s']}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded or synthesized /chat traffic and report latency by query_type")
+    parser.add_argument("--log", help="JSONL request log to replay (default: synthesize from --mix)")
+    parser.add_argument("--url", help="Base URL of a running server (default: start the app in-process)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Intent weights for synthesized traffic (default: {DEFAULT_MIX})")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Number of synthesized requests")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Concurrent client workers")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Poisson arrival rate in requests/s (0 = closed loop)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up for logs with recorded offsets")
+    parser.add_argument("--sessions", type=int, default=20, help="Distinct session ids in synthesized traffic")
+    parser.add_argument("--chart-format", choices=["plotly", "compact"], help="chart_format query parameter")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=IN_PROCESS_PORT, help="Port for the in-process server")
+    parser.add_argument("--output", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.log:
+        log = load_log(args.log, args.rate, args.speed, args.seed)
+    else:
+        log = synthesize(args.requests, args.mix, args.rate, args.sessions, args.seed)
+    base_url = args.url.rstrip("/") if args.url else start_in_process_server(args.port)
+
+    print(f"▶ Replaying {len(log)} requests against {base_url} with {args.concurrency} workers"
+          + (f" at {args.rate}/s" if args.rate > 0 else " (closed loop)"))
+    replayer = Replayer(base_url, args.concurrency, args.chart_format)
+    elapsed = replayer.run(log)
+    report = build_report(replayer.results, elapsed)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
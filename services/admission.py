@@ -0,0 +1,126 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import numpy as np
+
+# Per cost class: concurrent slots, requests allowed to wait, and the longest wait before shedding
+COST_CLASSES = {
+    "cheap": {"concurrency": 16, "max_queue": 64, "max_wait": 2.0},
+    "analysis": {"concurrency": 8, "max_queue": 32, "max_wait": 5.0},
+    "visualization": {"concurrency": 2, "max_queue": 8, "max_wait": 3.0},
+    "external_ai": {"concurrency": 4, "max_queue": 8, "max_wait": 1.0},
+    "training": {"concurrency": 1, "max_queue": 0, "max_wait": 0.0}
+}
+QUEUE_SAMPLES = 1000
+
+class Overloaded(Exception):
+    """Raised when a cost class is over its queue budget"""
+
+    def __init__(self, cost_class, retry_after):
+        super().__init__(f"{cost_class} requests are over budget")
+        self.cost_class = cost_class
+        self.retry_after = retry_after
+
+class CostClass:
+    """Slots and FIFO queue of one cost class; used only from the event loop thread"""
+
+    def __init__(self, name, concurrency, max_queue, max_wait):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.shed = 0
+        self.queue_times = deque(maxlen=QUEUE_SAMPLES)
+
+    @property
+    def queued(self):
+        return sum(not waiter.done() for waiter in self.waiters)
+
+    def overloaded(self):
+        self.shed += 1
+        return Overloaded(self.name, self.max_wait or 1.0)
+
+    async def acquire(self, wait=True):
+        start = time.perf_counter()
+        if self.active >= self.concurrency:
+            if not wait or self.queued >= self.max_queue:
+                raise self.overloaded()
+
+            # Waiting on a future holds no thread; release() hands the slot over directly
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, self.max_wait)
+            except asyncio.TimeoutError:
+                raise self.overloaded()
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+        else:
+            self.active += 1
+
+        self.admitted += 1
+        self.queue_times.append(time.perf_counter() - start)
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        waits = np.array(self.queue_times) * 1000
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "queue_ms": {
+                f"p{q}": round(float(np.percentile(waits, q)), 2) if len(waits) else 0.0
+                for q in (50, 95, 99)
+            }
+        }
+
+class AdmissionController:
+    """Separate bounded queues and concurrency limits per request cost class.
+
+    A request that finds its class full waits up to max_wait in a queue of at
+    most max_queue; beyond either budget it is shed immediately with
+    Overloaded, so slow classes cannot starve cheap ones. Queued requests wait
+    on the event loop, so only admitted ones occupy threadpool threads, and
+    the classes' concurrencies together stay below the threadpool size.
+    """
+
+    def __init__(self, classes=COST_CLASSES):
+        self.classes = {name: CostClass(name, **limits) for name, limits in classes.items()}
+
+    async def acquire(self, cost_class, wait=True):
+        await self.classes[cost_class].acquire(wait)
+
+    def release(self, cost_class):
+        self.classes[cost_class].release()
+
+    @asynccontextmanager
+    async def admit(self, cost_class, wait=True):
+        await self.acquire(cost_class, wait)
+        try:
+            yield
+        finally:
+            self.release(cost_class)
+
+    def stats(self):
+        return {name: cost_class.stats() for name, cost_class in self.classes.items()}
+
+admission = AdmissionController()
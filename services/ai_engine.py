@@ -3,6 +3,9 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 import pickle
 from pathlib import Path
+from services.quantile_sketch import quantile_sketches
+from services.climatology import climatology, ANOMALY_Z
+from services.derived import variable_label
 
 model = None
 model_path = Path("models/argo_model.pkl")
@@ -59,32 +62,60 @@ def predict_temperature(latitude, longitude, pressure):
     X = np.array([[latitude, longitude, pressure]])
     return round(model.predict(X)[0], 2)
 
+def predict_temperatures(latitudes, longitudes, pressures):
+    """predict_temperature for many points in one model call"""
+    global model
+    
+    if model is None:
+        load_model()
+    
+    if model is None:
+        return None
+    
+    X = np.column_stack([latitudes, longitudes, pressures])
+    return [round(float(value), 2) for value in model.predict(X)]
+
 def analyze_anomalies(df, variable="temperature"):
+    """Flag readings beyond ±2σ of their own (cell, depth band) climatology.
+
+    Uses the anomaly index built at load time, then the stored z-score column,
+    and only recomputes moments on the slice for frames that have neither.
+    """
     if df.empty or variable not in df.columns:
         return []
     
-    mean = df[variable].mean()
-    std = df[variable].std()
-    
     anomalies = []
     
-    extreme_high = df[df[variable] > mean + 2*std]
-    extreme_low = df[df[variable] < mean - 2*std]
-    
-    if len(extreme_high) > 0:
+    high_values = climatology.anomalous_values(df, variable, "high")
+    if high_values is not None:
+        low_values = climatology.anomalous_values(df, variable, "low")
+        context = " for their location and depth"
+    elif f"{variable}_z" in df.columns:
+        z = df[f"{variable}_z"].values
+        values = df[variable].values
+        high_values, low_values = values[z > ANOMALY_Z], values[z < -ANOMALY_Z]
+        context = " for their location and depth"
+    else:
+        mean = df[variable].mean()
+        std = df[variable].std()
+        values = df[variable].values
+        high_values, low_values = values[values > mean + 2*std], values[values < mean - 2*std]
+        context = ""
+    
+    if len(high_values) > 0:
         anomalies.append({
             "type": "high_anomaly",
             "severity": "warning",
-            "message": f"Detected {len(extreme_high)} unusually high {variable} readings",
-            "value": round(extreme_high[variable].mean(), 2)
+            "message": f"Detected {len(high_values)} unusually high {variable} readings{context}",
+            "value": round(high_values.mean(), 2)
         })
     
-    if len(extreme_low) > 0:
+    if len(low_values) > 0:
         anomalies.append({
             "type": "low_anomaly",
             "severity": "warning",
-            "message": f"Detected {len(extreme_low)} unusually low {variable} readings",
-            "value": round(extreme_low[variable].mean(), 2)
+            "message": f"Detected {len(low_values)} unusually low {variable} readings{context}",
+            "value": round(low_values.mean(), 2)
         })
     
     if len(df) < 50:
@@ -133,10 +164,16 @@ def get_location_insights(df, query):
     
     return " ".join(insights)
 
-def calculate_probabilities(df, variable="temperature"):
+def calculate_probabilities(df, variable="temperature", query=None, exact=False):
+    """Percentiles for the selection; merged cell sketches when the query allows, else exact"""
     if df.empty or variable not in df.columns:
         return {}
     
+    if query is not None and not exact:
+        sketched = quantile_sketches.estimate(variable, query)
+        if sketched:
+            return sketched
+    
     values = df[variable].values
     percentiles = np.percentile(values, [10, 25, 50, 75, 90])
     
@@ -147,7 +184,8 @@ def calculate_probabilities(df, variable="temperature"):
         "p75": round(percentiles[3], 2),
         "p90": round(percentiles[4], 2),
         "mean": round(values.mean(), 2),
-        "std": round(values.std(), 2)
+        "std": round(values.std(), 2),
+        "method": "exact"
     }
 
 def summarize(prompt: str, stats: dict):
@@ -158,7 +196,7 @@ def summarize(prompt: str, stats: dict):
     depth_range = stats.get("depth_range", (0, 0))
     data_points = stats.get("data_points", 0)
     
-    summary = f"Based on {data_points} ARGO measurements, the {variable} ranges from {min_val} to {max_val}, "
+    summary = f"Based on {data_points} ARGO measurements, the {variable_label(variable)} ranges from {min_val} to {max_val}, "
     summary += f"with an average of {mean_val}. "
     summary += f"Data spans depths from {depth_range[0]} to {depth_range[1]} dbar. "
     
@@ -0,0 +1,101 @@
+import numpy as np
+
+CELL_SIZE = 5
+DEPTH_EDGES = [0, 50, 100, 200, 500, 1000, 2000, np.inf]
+CLIMATOLOGY_VARIABLES = ["temperature", "salinity"]
+ANOMALY_Z = 2
+
+N_LAT = 180 // CELL_SIZE
+N_LON = 360 // CELL_SIZE
+N_DEPTH = len(DEPTH_EDGES) - 1
+
+def cell_ids(df):
+    """(lat cell, lon cell, depth band) of every row as one flat id"""
+    lat_bin = np.clip(((df["latitude"].values + 90) // CELL_SIZE).astype(int), 0, N_LAT - 1)
+    lon_bin = np.clip(((df["longitude"].values + 180) // CELL_SIZE).astype(int), 0, N_LON - 1)
+    depth_bin = np.clip(np.searchsorted(DEPTH_EDGES, df["pressure"].values, side="right") - 1, 0, N_DEPTH - 1)
+    return (lat_bin * N_LON + lon_bin) * N_DEPTH + depth_bin
+
+class CellClimatology:
+    """Running mean/variance per (lat/lon cell, depth band), updated as data is ingested.
+
+    Each batch is reduced with bincount and merged into the running moments with
+    the parallel form of Welford's update, so ingesting costs O(rows) once and
+    never revisits earlier batches.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        size = N_LAT * N_LON * N_DEPTH
+        self.count = np.zeros(size)
+        self.mean = {variable: np.zeros(size) for variable in CLIMATOLOGY_VARIABLES}
+        self.m2 = {variable: np.zeros(size) for variable in CLIMATOLOGY_VARIABLES}
+        self.generation = None
+        self.anomalies = {}
+
+    def supports(self, df):
+        return not df.empty and all(col in df.columns for col in ["latitude", "longitude", "pressure"])
+
+    def update(self, df):
+        """Merge a newly ingested batch into the running moments"""
+        if not self.supports(df):
+            return
+
+        cells = cell_ids(df)
+        size = len(self.count)
+        batch_count = np.bincount(cells, minlength=size).astype(float)
+        total = self.count + batch_count
+        seen = batch_count > 0
+
+        for variable in CLIMATOLOGY_VARIABLES:
+            if variable not in df.columns:
+                continue
+            values = df[variable].values.astype(float)
+            batch_mean = np.divide(np.bincount(cells, weights=values, minlength=size), batch_count, out=np.zeros(size), where=seen)
+            batch_m2 = np.bincount(cells, weights=(values - batch_mean[cells]) ** 2, minlength=size)
+
+            delta = batch_mean - self.mean[variable]
+            self.mean[variable] = np.where(seen, self.mean[variable] + delta * np.divide(batch_count, total, out=np.zeros(size), where=seen), self.mean[variable])
+            self.m2[variable] = self.m2[variable] + batch_m2 + np.divide(delta ** 2 * self.count * batch_count, total, out=np.zeros(size), where=seen)
+
+        self.count = total
+
+    def zscores(self, df, variable):
+        """z-score of each row against its cell's climatology (0 where undefined)"""
+        cells = cell_ids(df)
+        count = self.count[cells]
+        std = np.sqrt(np.divide(self.m2[variable][cells], count - 1, out=np.zeros(len(cells)), where=count > 1))
+        return np.divide(df[variable].values - self.mean[variable][cells], std, out=np.zeros(len(cells)), where=std > 0)
+
+    def index_anomalies(self, df):
+        """Sorted row positions beyond ±ANOMALY_Z for each variable of the loaded dataset"""
+        self.generation = df.attrs.get("generation")
+        self.anomalies = {}
+        for variable in CLIMATOLOGY_VARIABLES:
+            column = f"{variable}_z"
+            if column in df.columns:
+                z = df[column].values
+                values = df[variable].values
+                high, low = np.flatnonzero(z > ANOMALY_Z), np.flatnonzero(z < -ANOMALY_Z)
+                self.anomalies[variable] = {
+                    "high": (high, values[high]),
+                    "low": (low, values[low])
+                }
+
+    def anomalous_values(self, df, variable, kind):
+        """Values of the indexed anomalous rows that fall inside df, or None if df is not from the indexed dataset"""
+        if variable not in self.anomalies or df.attrs.get("generation") != self.generation or self.generation is None:
+            return None
+        index = df.index.values
+        if not df.index.is_monotonic_increasing:
+            return None
+
+        positions, values = self.anomalies[variable][kind]
+        if len(index) == 0:
+            return values[:0]
+        found = np.minimum(np.searchsorted(index, positions), len(index) - 1)
+        return values[index[found] == positions]
+
+climatology = CellClimatology()
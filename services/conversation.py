@@ -8,18 +8,31 @@ class ConversationManager:
         if session_id not in self.conversations:
             self.conversations[session_id] = []
         
+        # Ids are 1-based positions in the session, so a cursor is also a list offset
+        message_id = len(self.conversations[session_id]) + 1
         self.conversations[session_id].append({
+            "id": message_id,
             "role": role,
             "content": content,
             "metadata": metadata,
             "timestamp": datetime.now().isoformat()
         })
+        return message_id
     
     def get_history(self, session_id, limit=10):
         if session_id not in self.conversations:
             return []
         return self.conversations[session_id][-limit:]
     
+    def get_since(self, session_id, cursor=0, limit=None):
+        """Messages with id greater than cursor, oldest first"""
+        messages = self.conversations.get(session_id, [])
+        end = None if limit is None else cursor + limit
+        return messages[max(cursor, 0):end]
+    
+    def last_id(self, session_id):
+        return len(self.conversations.get(session_id, []))
+    
     def get_context(self, session_id):
         history = self.get_history(session_id, limit=5)
         context = ""
@@ -1,13 +1,21 @@
 import pandas as pd
 from pathlib import Path
+from services.climatology import climatology, CLIMATOLOGY_VARIABLES
+from services.profiles import sort_profiles, assign_profile_ids
+
+# Bumped on every load; caches derived from the dataset key on it
+dataset_generation = 0
 
 def load_data():
     """Load preprocessed ARGO data from multiple files"""
+    global dataset_generation
     all_data = []
+    climatology.reset()
     
     # Load parquet files if available
     for parquet_file in Path("data").glob("*.parquet"):
         df = pd.read_parquet(parquet_file)
+        climatology.update(df)
         all_data.append(df)
     
     # Load raw txt files if no parquet found
@@ -15,19 +23,35 @@ def load_data():
         for txt_file in Path("data").glob("*.txt"):
             try:
                 df = pd.read_csv(txt_file, comment="#", sep=",", low_memory=False, nrows=10000)
-                cols = ["latitude", "longitude", "pres_adjusted", "temp_adjusted", "psal_adjusted"]
+                cols = ["platform_number", "cycle_number", "latitude", "longitude", "pres_adjusted", "temp_adjusted", "psal_adjusted"]
                 df = df[[c for c in cols if c in df.columns]]
                 df.rename(columns={
                     "pres_adjusted": "pressure",
                     "temp_adjusted": "temperature",
                     "psal_adjusted": "salinity"
                 }, inplace=True)
-                all_data.append(df.dropna())
+                df = df.dropna()
+                climatology.update(df)
+                all_data.append(df)
             except Exception as e:
                 print(f"Error loading {txt_file}: {e}")
     
     if all_data:
         combined_df = pd.concat(all_data, ignore_index=True)
+        # Keep rows in time order so time windows are contiguous slices (see services/time_index.py),
+        # and each profile contiguous and pressure-ordered within that (see services/profiles.py)
+        combined_df = sort_profiles(combined_df)
+        profile_ids = assign_profile_ids(combined_df)
+        if profile_ids is not None:
+            combined_df["profile_id"] = profile_ids
+        # Per-row z-scores against the (lat/lon cell, depth band) climatology built during ingestion
+        if climatology.supports(combined_df):
+            for variable in CLIMATOLOGY_VARIABLES:
+                if variable in combined_df.columns:
+                    combined_df[f"{variable}_z"] = climatology.zscores(combined_df, variable)
+        dataset_generation += 1
+        combined_df.attrs["generation"] = dataset_generation
+        climatology.index_anomalies(combined_df)
         print(f"✅ Loaded {len(combined_df)} records from {len(all_data)} files")
         return combined_df
     
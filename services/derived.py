@@ -0,0 +1,216 @@
+import re
+import threading
+import numpy as np
+from services.profiles import segment_starts, profile_gradient
+
+# Mixed layer: first depth where potential density exceeds its 10 m value by 0.03 kg/m³ (de Boyer Montégut et al., 2004)
+MLD_REFERENCE_DEPTH = 10
+MLD_DENSITY_THRESHOLD = 0.03
+
+def pressure_to_depth(pressure, latitude):
+    """Depth in meters from pressure in dbar (UNESCO 1983, Saunders & Fofonoff)"""
+    x = np.sin(np.radians(latitude)) ** 2
+    gravity = 9.780318 * (1.0 + (5.2788e-3 + 2.36e-5 * x) * x) + 1.092e-6 * pressure
+    return (((-1.82e-15 * pressure + 2.279e-10) * pressure - 2.2512e-5) * pressure + 9.72659) * pressure / gravity
+
+def depth_to_pressure(depth, latitude):
+    """Pressure in dbar at a depth in meters, inverting pressure_to_depth by fixed-point iteration"""
+    pressure = np.asarray(depth, dtype=float)
+    for _ in range(4):
+        pressure = pressure + (depth - pressure_to_depth(pressure, latitude))
+    return pressure
+
+def potential_temperature(salinity, temperature, pressure):
+    """Potential temperature referenced to the surface (Bryden, 1973); pressure in dbar"""
+    s, t, p = salinity - 35.0, temperature, pressure / 10.0
+    return (
+        t
+        - p * (3.6504e-4 + t * (8.3198e-5 + t * (-5.4065e-7 + t * 4.0274e-9)))
+        - p * s * (1.7439e-5 - 2.9778e-7 * t)
+        - p ** 2 * (8.9309e-7 + t * (-3.1628e-8 + t * 2.1987e-10))
+        + 4.1057e-9 * s * p ** 2
+        - p ** 3 * (-1.6056e-10 + 5.0484e-12 * t)
+    )
+
+def surface_density(salinity, temperature):
+    """Seawater density at zero pressure in kg/m³ (EOS-80)"""
+    s, t = np.clip(salinity, 0, None), temperature
+    water = 999.842594 + t * (6.793952e-2 + t * (-9.095290e-3 + t * (1.001685e-4 + t * (-1.120083e-6 + t * 6.536332e-9))))
+    return (
+        water
+        + s * (0.824493 + t * (-4.0899e-3 + t * (7.6438e-5 + t * (-8.2467e-7 + t * 5.3875e-9))))
+        + s ** 1.5 * (-5.72466e-3 + t * (1.0227e-4 - t * 1.6546e-6))
+        + 4.8314e-4 * s ** 2
+    )
+
+def first_per_profile(profile_ids, mask, n_profiles):
+    """Row position of the first True row of each profile, -1 where a profile has none"""
+    first = np.full(n_profiles, -1)
+    positions = np.flatnonzero(mask)
+    profiles, found = np.unique(profile_ids[positions], return_index=True)
+    first[profiles] = positions[found]
+    return first
+
+def profile_numbers(profile_ids):
+    """Dense 0..n-1 number of each row's profile (ids need not start at 0 in a subset)"""
+    starts = segment_starts(profile_ids)
+    numbers = np.zeros(len(profile_ids), dtype=int)
+    numbers[starts[1:]] = 1
+    return np.cumsum(numbers), starts
+
+def compute_depth(df, values):
+    return pressure_to_depth(df["pressure"].values.astype(float), df["latitude"].values.astype(float))
+
+def compute_potential_density(df, values):
+    salinity = df["salinity"].values.astype(float)
+    # EOS-80 takes IPTS-68 temperatures; ARGO reports ITS-90
+    theta = potential_temperature(salinity, df["temperature"].values * 1.00024, df["pressure"].values.astype(float))
+    return surface_density(salinity, theta)
+
+def compute_mixed_layer_depth(df, values):
+    """Per-profile mixed layer depth, repeated on every row of the profile"""
+    depth, density = values("depth"), values("potential_density")
+    numbers, starts = profile_numbers(df["profile_id"].values)
+    n_profiles = len(starts)
+
+    # Reference: first sample at or below 10 m, else the shallowest sample
+    reference = first_per_profile(numbers, depth >= MLD_REFERENCE_DEPTH, n_profiles)
+    reference = np.where(reference >= 0, reference, starts)
+    threshold = density[reference] + MLD_DENSITY_THRESHOLD
+
+    below = first_per_profile(numbers, (density > threshold[numbers]) & (np.arange(len(df)) > reference[numbers]), n_profiles)
+    deepest = np.append(starts[1:], len(df)) - 1
+    mld = depth[deepest].copy()
+
+    # Interpolate between the crossing sample and the one above it
+    crossed = below >= 0
+    lower, upper = below[crossed], below[crossed] - 1
+    span = density[lower] - density[upper]
+    fraction = np.divide(threshold[crossed] - density[upper], span, out=np.ones(len(span)), where=span > 0)
+    mld[crossed] = depth[upper] + fraction * (depth[lower] - depth[upper])
+    return mld[numbers]
+
+def compute_thermocline_depth(df, values):
+    """Per-profile depth of the steepest temperature decrease below the surface layer, repeated on every row of the profile"""
+    depth = values("depth")
+    profile_ids = df["profile_id"].values
+    numbers, starts = profile_numbers(profile_ids)
+    cooling = -profile_gradient(df["temperature"].values, profile_ids, coords=depth)
+    cooling[depth < MLD_REFERENCE_DEPTH] = -np.inf
+    steepest = np.maximum.reduceat(cooling, starts)
+    first = first_per_profile(numbers, cooling == steepest[numbers], len(starts))
+    return depth[first][numbers]
+
+# name: (function, required raw columns, derived columns it builds on, unit, whole-profile)
+DERIVED_VARIABLES = {
+    "depth": (compute_depth, ["pressure", "latitude"], [], "m", False),
+    "potential_density": (compute_potential_density, ["pressure", "temperature", "salinity"], [], "kg/m³", False),
+    "mixed_layer_depth": (compute_mixed_layer_depth, ["profile_id"], ["depth", "potential_density"], "m", True),
+    "thermocline_depth": (compute_thermocline_depth, ["profile_id", "temperature"], ["depth"], "m", True)
+}
+
+# Prompt words naming each variable, most specific first
+VARIABLE_WORDS = [
+    ("mixed_layer_depth", ["mixed layer", "mld"]),
+    ("thermocline_depth", ["thermocline"]),
+    ("potential_density", ["density"]),
+    ("salinity", ["salinity"]),
+    ("temperature", ["temperature"]),
+    ("depth", ["depth"]),
+    ("pressure", ["pressure"])
+]
+CONDITION_PATTERN = re.compile(
+    r"\b(" + "|".join(word for _, words in VARIABLE_WORDS for word in words) + r")\s+"
+    r"(above|over|greater than|more than|deeper than|below|under|less than|shallower than)\s+(-?\d+(?:\.\d+)?)"
+)
+LOWER_BOUND_WORDS = {"above", "over", "greater than", "more than", "deeper than"}
+
+def variable_for_word(word):
+    for variable, words in VARIABLE_WORDS:
+        if word in words:
+            return variable
+    return None
+
+def extract_conditions(prompt):
+    """Value conditions such as "density above 1027" as sorted (variable, op, value) tuples"""
+    conditions = set()
+    for word, relation, value in CONDITION_PATTERN.findall(prompt.lower()):
+        op = ">" if relation in LOWER_BOUND_WORDS else "<"
+        conditions.add((variable_for_word(word), op, float(value)))
+    return tuple(sorted(conditions))
+
+class DerivedColumns:
+    """Derived oceanographic variables of the loaded dataset.
+
+    Every supported column is computed once per dataset generation when the
+    dataset is attached, before it is shared with request threads, and added
+    to the dataset, so filters and aggregates read it like a raw column.
+    Frames sliced from the dataset before the column existed read it back by
+    row label; frames from elsewhere are computed directly. Whole-profile
+    variables need profile_id and complete profiles.
+    """
+
+    def __init__(self):
+        self.df = None
+        self.generation = None
+        self.columns = {}
+        self.lock = threading.Lock()
+
+    def attach(self, df):
+        """Add derived columns to a newly loaded dataset, dropping the previous generation's"""
+        with self.lock:
+            self.df = df
+            self.generation = df.attrs.get("generation")
+            self.columns = {}
+            # Up front: inserting a column while other threads filter the frame is not safe
+            for name in DERIVED_VARIABLES:
+                self.add(name)
+
+    def supports(self, df, name):
+        if name in df.columns:
+            return True
+        if name not in DERIVED_VARIABLES:
+            return False
+        _, required, builds_on, _, _ = DERIVED_VARIABLES[name]
+        return all(col in df.columns for col in required) and all(self.supports(df, dep) for dep in builds_on)
+
+    def ensure(self, names):
+        """Add any missing derived columns in names to the attached dataset"""
+        if self.df is None:
+            return
+        with self.lock:
+            for name in names:
+                self.add(name)
+
+    def add(self, name):
+        if name in self.df.columns or name not in DERIVED_VARIABLES or not self.supports(self.df, name):
+            return
+        for dependency in DERIVED_VARIABLES[name][2]:
+            self.add(dependency)
+        self.df[name] = self.compute(self.df, name)
+        self.columns[name] = self.df[name].values
+
+    def compute(self, df, name):
+        function = DERIVED_VARIABLES[name][0]
+        return function(df, lambda dependency: self.values(df, dependency))
+
+    def values(self, df, name):
+        """Values of a raw or derived column for the rows of df"""
+        if name in df.columns:
+            return df[name].values
+        if self.generation is not None and df.attrs.get("generation") == self.generation:
+            if name not in self.columns:
+                self.ensure([name])
+            if name in self.columns:
+                return self.columns[name][df.index.values]
+        return self.compute(df, name)
+
+def variable_unit(name):
+    if name in DERIVED_VARIABLES:
+        return DERIVED_VARIABLES[name][3]
+    return {"temperature": "°C", "salinity": "PSU", "pressure": "dbar"}.get(name, "")
+
+def variable_label(name):
+    return name.replace("_", " ")
+
+derived_columns = DerivedColumns()
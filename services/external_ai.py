@@ -1,6 +1,7 @@
 import os
 import requests
 from pathlib import Path
+from services.single_flight import single_flight, normalize_prompt
 
 # Get API key from environment variable
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
@@ -11,14 +12,18 @@ def is_oceanographic_query(prompt):
         "ocean", "sea", "water", "marine", "temperature", "salinity", "pressure",
         "depth", "tsunami", "wave", "current", "tide", "fish", "whale", "coral",
         "ice", "glacier", "arctic", "antarctic", "climate", "argo", "pacific",
-        "atlantic", "indian ocean", "southern ocean", "coastal", "beach", "shore"
+        "atlantic", "indian ocean", "southern ocean", "coastal", "beach", "shore",
+        "density", "mixed layer", "mld", "thermocline"
     ]
     
     prompt_lower = prompt.lower()
     return any(keyword in prompt_lower for keyword in ocean_keywords)
 
 def query_gemini(prompt):
-    """Query Google Gemini API for general questions"""
+    """Query Google Gemini API for general questions; identical concurrent prompts share one round trip"""
+    return single_flight.do(("gemini", normalize_prompt(prompt)), request_gemini, prompt)
+
+def request_gemini(prompt):
     if not GEMINI_API_KEY:
         return "External AI service not configured. Please set GEMINI_API_KEY environment variable."
     
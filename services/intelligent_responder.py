@@ -1,5 +1,9 @@
 import pandas as pd
 import numpy as np
+from services.regions import region_registry, region_mask
+from services.query_engine import extract_time_window
+from services.time_index import time_index
+from services.derived import derived_columns
 
 def classify_query_intent(prompt):
     """Classify user query into specific intent categories"""
@@ -47,18 +51,7 @@ def extract_region_from_prompt(prompt):
     """Extract specific ocean region from prompt"""
     prompt_lower = prompt.lower()
     
-    if "indian ocean" in prompt_lower or "india" in prompt_lower:
-        return {"name": "Indian Ocean", "lat_range": (-40, 30), "lon_range": (40, 120)}
-    elif "pacific" in prompt_lower:
-        return {"name": "Pacific Ocean", "lat_range": (-60, 60), "lon_range": (120, -70)}
-    elif "atlantic" in prompt_lower:
-        return {"name": "Atlantic Ocean", "lat_range": (-60, 60), "lon_range": (-70, 20)}
-    elif "southern ocean" in prompt_lower or "antarctica" in prompt_lower or "antarctic" in prompt_lower:
-        return {"name": "Southern Ocean/Antarctica", "lat_range": (-90, -40), "lon_range": (-180, 180)}
-    elif "arctic" in prompt_lower:
-        return {"name": "Arctic Ocean", "lat_range": (60, 90), "lon_range": (-180, 180)}
-    
-    return None
+    return region_registry.find("ocean", prompt_lower)
 
 def generate_pressure_response(df, region_info):
     """Generate response for water pressure queries"""
@@ -72,8 +65,13 @@ def generate_pressure_response(df, region_info):
     region_name = region_info["name"] if region_info else "the analyzed region"
     
     response = f"**Water Pressure Analysis for {region_name}:**\n\n"
-    response += f"Average depth: {round(avg_pressure, 1)} dbar (approximately {round(avg_pressure, 0)} meters)\n"
-    response += f"Depth range: {round(min_pressure, 1)} to {round(max_pressure, 1)} dbar\n"
+    if derived_columns.supports(df, "depth"):
+        depth = derived_columns.values(df, "depth")
+        response += f"Average pressure: {round(avg_pressure, 1)} dbar (a depth of about {round(depth.mean(), 0)} meters at these latitudes)\n"
+        response += f"Depth range: {round(min_pressure, 1)} to {round(max_pressure, 1)} dbar ({round(depth.min(), 1)} to {round(depth.max(), 1)} m)\n"
+    else:
+        response += f"Average pressure: {round(avg_pressure, 1)} dbar\n"
+        response += f"Depth range: {round(min_pressure, 1)} to {round(max_pressure, 1)} dbar\n"
     response += f"Data points: {len(df)} measurements\n\n"
     
     if avg_pressure < 100:
@@ -172,7 +170,24 @@ def generate_marine_life_response(df, region_info):
     
     return response
 
-def generate_climate_response(df):
+def describe_temperature_trend(region_info=None, start_time=None, end_time=None):
+    """Summarize the precomputed annual temperature rollup for a region"""
+    region_key = region_info["key"] if region_info else None
+    series = [entry for entry in time_index.rollup(region_key, "annual", start_time, end_time) if "temperature" in entry]
+    if len(series) < 3:
+        return ""
+    
+    years = np.array([int(entry["period"]) for entry in series])
+    temps = np.array([entry["temperature"] for entry in series])
+    slope = np.polyfit(years, temps, 1)[0]
+    
+    region_name = region_info["name"] if region_info else "all regions"
+    response = f"**Temperature Trend ({region_name}, {years[0]}-{years[-1]}):** {slope * 10:+.2f}°C per decade\n"
+    for entry in series[-5:]:
+        response += f"- {entry['period']}: {entry['temperature']}°C ({entry['count']} measurements)\n"
+    return response + "\n"
+
+def generate_climate_response(df, region_info=None, start_time=None, end_time=None):
     """Generate response for climate change queries"""
     response = "**Climate Change and Ocean Impact:**\n\n"
     
@@ -182,6 +197,7 @@ def generate_climate_response(df):
         
         response += f"Current ocean temperature: {round(avg_temp, 2)}°C\n"
         response += f"Temperature variability: {round(temp_std, 2)}°C\n\n"
+        response += describe_temperature_trend(region_info, start_time, end_time)
         
         response += "**Key Climate Indicators:**\n"
         response += "- Ocean absorbs 90% of excess heat from global warming\n"
@@ -208,15 +224,14 @@ def generate_intelligent_response(prompt, df):
     intent = classify_query_intent(prompt)
     region_info = extract_region_from_prompt(prompt)
     
-    # Filter by region if specified
+    # Filter by time window first (a contiguous slice on the full dataset), then region
     filtered_df = df
-    if region_info and "latitude" in df.columns and "longitude" in df.columns:
-        filtered_df = df[
-            (df["latitude"] >= region_info["lat_range"][0]) &
-            (df["latitude"] <= region_info["lat_range"][1]) &
-            (df["longitude"] >= region_info["lon_range"][0]) &
-            (df["longitude"] <= region_info["lon_range"][1])
-        ]
+    start_time, end_time = extract_time_window(prompt)
+    if start_time is not None or end_time is not None:
+        filtered_df = time_index.select(filtered_df, start_time, end_time)
+    
+    if region_info and "latitude" in filtered_df.columns and "longitude" in filtered_df.columns:
+        filtered_df = filtered_df[region_mask(filtered_df, region_info)]
     
     if intent == "pressure":
         return generate_pressure_response(filtered_df, region_info)
@@ -225,7 +240,7 @@ def generate_intelligent_response(prompt, df):
     elif intent == "marine_life":
         return generate_marine_life_response(filtered_df, region_info)
     elif intent == "climate":
-        return generate_climate_response(filtered_df)
+        return generate_climate_response(filtered_df, region_info, start_time, end_time)
     elif intent == "salinity":
         if "salinity" in filtered_df.columns:
             avg_sal = filtered_df["salinity"].mean()
@@ -0,0 +1,93 @@
+import numpy as np
+from sklearn.neighbors import BallTree
+from services.profiles import segment_starts
+
+EARTH_RADIUS_KM = 6371.0088
+OBSERVATION_COLUMNS = ["latitude", "longitude", "time", "pressure", "temperature", "salinity"]
+MAX_NEIGHBOURS = 100
+
+class NearestObservations:
+    """Haversine ball tree over profile positions, with pressure as the secondary key.
+
+    The tree indexes one position per profile (or per row without profile_id).
+    A lookup finds the nearest profiles on the sphere, then binary-searches
+    each profile's pressure-sorted samples for the one closest to the
+    requested pressure, all vectorized across query points.
+    """
+
+    def __init__(self):
+        self.df = None
+        self.tree = None
+        self.offsets = None
+        self.keys = None
+        self.stride = None
+
+    def build(self, df):
+        self.df = df
+        self.tree = None
+        if df.empty or not all(col in df.columns for col in ["latitude", "longitude", "pressure"]):
+            return
+
+        starts = segment_starts(df["profile_id"].values) if "profile_id" in df.columns else np.arange(len(df))
+        self.offsets = np.append(starts, len(df))
+        positions = np.radians(df[["latitude", "longitude"]].values[starts])
+        self.tree = BallTree(positions, metric="haversine")
+
+        # (unit, pressure) composite key, sorted because units are contiguous and pressure-ordered
+        pressure = df["pressure"].values.astype(float)
+        self.stride = float(pressure.max()) + 1.0
+        unit = np.repeat(np.arange(len(starts)), np.diff(self.offsets))
+        self.keys = unit * self.stride + pressure
+
+    @property
+    def ready(self):
+        return self.tree is not None
+
+    def closest_samples(self, units, pressures):
+        """Row of each unit whose pressure is closest to the paired pressure (the shallowest when pressure is None)"""
+        starts, ends = self.offsets[units], self.offsets[units + 1]
+        if pressures is None:
+            return starts
+
+        upper = np.clip(np.searchsorted(self.keys, units * self.stride + pressures), starts, ends - 1)
+        lower = np.maximum(upper - 1, starts)
+        pressure = self.df["pressure"].values
+        return np.where(np.abs(pressure[lower] - pressures) <= np.abs(pressure[upper] - pressures), lower, upper)
+
+    def observations(self, rows, distances, pressure=None):
+        found = self.df.iloc[rows]
+        columns = [col for col in OBSERVATION_COLUMNS if col in found.columns]
+        records = []
+        for i, row in enumerate(found[columns].itertuples(index=False)):
+            record = {col: (str(value) if col == "time" else round(float(value), 3)) for col, value in zip(columns, row)}
+            record["distance_km"] = round(float(distances[i]), 2)
+            if pressure is not None:
+                record["pressure_difference"] = round(float(record["pressure"] - pressure), 1)
+            records.append(record)
+        return records
+
+    def k_nearest(self, latitudes, longitudes, pressures=None, k=5):
+        """k nearest profiles' closest-pressure observations for each point, nearest first"""
+        points = np.radians(np.column_stack([latitudes, longitudes]))
+        k = min(k, len(self.offsets) - 1)
+        distances, units = self.tree.query(points, k=k)
+        results = []
+        for i in range(len(points)):
+            pressure = None if pressures is None else pressures[i]
+            rows = self.closest_samples(units[i], None if pressure is None else np.full(k, pressure))
+            results.append(self.observations(rows, distances[i] * EARTH_RADIUS_KM, pressure))
+        return results
+
+    def within_radius(self, latitudes, longitudes, radius_km, pressures=None, limit=MAX_NEIGHBOURS):
+        """Closest-pressure observations of every profile within radius_km of each point, nearest first"""
+        points = np.radians(np.column_stack([latitudes, longitudes]))
+        units, distances = self.tree.query_radius(points, r=radius_km / EARTH_RADIUS_KM, return_distance=True, sort_results=True)
+        results = []
+        for i in range(len(points)):
+            pressure = None if pressures is None else pressures[i]
+            found = units[i][:limit]
+            rows = self.closest_samples(found, None if pressure is None else np.full(len(found), pressure))
+            results.append(self.observations(rows, distances[i][:limit] * EARTH_RADIUS_KM, pressure))
+        return results
+
+nearest_observations = NearestObservations()
@@ -0,0 +1,320 @@
+import os
+import time
+import atexit
+import signal
+import shutil
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+from services.regions import region_registry
+from services.profiles import profile_index
+from services.derived import derived_columns
+from services.sample_pyramid import sample_pyramid
+from services.visualizer import temperature_depth_plot, generate_heatmap, generate_probability_distribution
+from services.tsunami_predictor import generate_tsunami_analysis, train_tsunami_model, load_tsunami_model, risk_cache
+from services.ai_engine import train_model, load_model
+
+# Worker processes; 0 runs everything in the server process. Each worker holds its own
+# copy of the dataset and indexes, so the default stays small on many-core hosts.
+MAX_DEFAULT_WORKERS = 4
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", min(MAX_DEFAULT_WORKERS, max(1, (os.cpu_count() or 2) - 1))))
+# Seconds a task may take, queueing included, before it is cancelled, per kind of work
+TASK_TIMEOUTS = {"visualization": 30.0, "analysis": 60.0, "training": 900.0}
+# Extra seconds the server waits for a worker to report its own timeout
+TIMEOUT_GRACE = 5.0
+
+CHARTS = {
+    "temperature_depth_plot": temperature_depth_plot,
+    "generate_heatmap": generate_heatmap,
+    "generate_probability_distribution": generate_probability_distribution
+}
+
+class OffloadTimeout(Exception):
+    """Raised when an offloaded task runs past its timeout and has been cancelled"""
+
+    def __init__(self, kind, timeout):
+        # Both in args, so the exception pickles back from a worker
+        super().__init__(kind, timeout)
+        self.kind = kind
+        self.timeout = timeout
+
+    def __str__(self):
+        return f"{self.kind} task cancelled after {self.timeout:g}s"
+
+# ===== Worker side =====
+worker_df = None
+
+def export_dataset(df, directory):
+    """Write every column to a .npy file workers memory-map at startup; returns the manifest"""
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column].values
+        if values.dtype == object:
+            values = values.astype(str)
+        np.save(os.path.join(directory, f"{i}.npy"), values)
+        columns.append(column)
+    return {"directory": directory, "columns": columns, "generation": df.attrs.get("generation")}
+
+def init_worker(manifest):
+    """Rebuild the dataset from the memory-mapped export and warm the lookups charts and analyses use"""
+    global worker_df
+    arrays = {
+        column: np.load(os.path.join(manifest["directory"], f"{i}.npy"), mmap_mode="r")
+        for i, column in enumerate(manifest["columns"])
+    }
+    df = pd.DataFrame(arrays, copy=False)
+    # Same generation as the server's dataset, so row-label lookups line up
+    df.attrs["generation"] = manifest["generation"]
+    region_registry.label(df)
+    profile_index.build(df)
+    derived_columns.attach(df)
+    sample_pyramid.build(df)
+    load_tsunami_model()
+    worker_df = df
+
+def worker_ready():
+    return os.getpid()
+
+def deadline_task(kind, timeout, deadline, task, *args):
+    """task(*args), interrupted with OffloadTimeout at the deadline so the worker is freed for the next task"""
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise OffloadTimeout(kind, timeout)
+    if not hasattr(signal, "setitimer"):
+        return task(*args)
+
+    def expire(signum, frame):
+        raise OffloadTimeout(kind, timeout)
+
+    # Tasks run on the worker's main thread, where Python delivers signals
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        return task(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def worker_frame(rows, columns):
+    """Dataset rows by position (with any derived columns the server had), or a frame sent with the task"""
+    if not isinstance(rows, np.ndarray):
+        return rows
+    derived_columns.ensure([col for col in columns if col not in worker_df.columns])
+    return worker_df.iloc[rows]
+
+def chart_task(name, rows, columns, *args):
+    return CHARTS[name](worker_frame(rows, columns), *args)
+
+def tsunami_task(user_prompt, method):
+    return generate_tsunami_analysis(worker_df, user_prompt, method)
+
+def train_task():
+    return train_model(worker_df), train_tsunami_model(worker_df)
+
+# ===== Server side =====
+class Offloader:
+    """Process pool for CPU-bound chart building, tsunami analysis and training.
+
+    Workers are spawned at startup and pre-warmed from a memory-mapped export
+    of the dataset, so tasks carry only row positions and parameters and the
+    server's threads just wait on futures. Every task gets a deadline from
+    its kind's timeout: a task still queued at the deadline is cancelled, and
+    a running one is interrupted inside its worker, which stays in the pool.
+    Without a pool (disabled, or broken by a crashed worker) the work runs
+    in the calling process as before.
+    """
+
+    def __init__(self, workers=OFFLOAD_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.manifest = None
+        self.df = None
+        self.lock = threading.Lock()
+        self.counts = {"submitted": 0, "completed": 0, "inline": 0, "timed_out": 0, "cancelled": 0, "restarts": 0}
+        atexit.register(self.shutdown)
+
+    def start(self, df):
+        """Export df and start workers pre-warmed with it; False when offloading is disabled"""
+        self.shutdown()
+        if self.workers <= 0 or df.empty:
+            return False
+        self.manifest = export_dataset(df, tempfile.mkdtemp(prefix="floatchat-offload-"))
+        try:
+            executor = self.spawn(wait=True)
+        except (BrokenProcessPool, OSError) as e:
+            # e.g. an unguarded __main__ re-running server startup in the spawned workers
+            print(f"Offload pool unavailable, running analysis in-process: {e}")
+            self.shutdown()
+            return False
+        with self.lock:
+            self.executor = executor
+            self.df = df
+        return True
+
+    def spawn(self, wait=False):
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self.manifest,)
+        )
+        # Start every worker now; at startup also wait for them, so the first requests don't pay for loading
+        warmups = [executor.submit(worker_ready) for _ in range(self.workers)]
+        if wait:
+            for future in warmups:
+                future.result()
+        return executor
+
+    def restart(self, executor=None):
+        """Replace the pool (only if it is still executor) without waiting for the new workers to load"""
+        with self.lock:
+            old = self.executor
+            if old is None or (executor is not None and old is not executor):
+                return
+            self.executor = self.spawn()
+            self.counts["restarts"] += 1
+        # Tasks already queued on the old pool still run there
+        old.shutdown(wait=False)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor, self.df = self.executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self.manifest is not None:
+            shutil.rmtree(self.manifest["directory"], ignore_errors=True)
+            self.manifest = None
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def rows(self, df):
+        """Row positions when df really is a slice of the exported dataset, else the frame itself"""
+        dataset = self.df
+        if dataset is None or df.attrs.get("generation") != self.manifest["generation"]:
+            return df
+        if not pd.api.types.is_integer_dtype(df.index.dtype):
+            return df
+        positions = df.index.values
+        if len(positions) and (positions.min() < 0 or positions.max() >= len(dataset)):
+            return df
+        # attrs survive copies and reshaping, so check the rows themselves before trusting the labels
+        for column in ["latitude", "longitude", "pressure"]:
+            if column in df.columns and not np.array_equal(dataset[column].values[positions], df[column].values, equal_nan=True):
+                return df
+        return positions
+
+    def submit(self, kind, task, args):
+        """(executor, future, deadline) for task(*args) in the pool; no future without a pool"""
+        timeout = TASK_TIMEOUTS[kind]
+        deadline = time.time() + timeout
+        executor = self.executor
+        if executor is None:
+            return None, None, deadline
+        try:
+            future = executor.submit(deadline_task, kind, timeout, deadline, task, *args)
+        except (BrokenProcessPool, RuntimeError):
+            self.restart(executor)
+            return None, None, deadline
+        self.count("submitted")
+        return executor, future, deadline
+
+    def expire(self, future, kind):
+        """A task past its deadline: cancel it if still queued (a running one is interrupted by its worker)"""
+        if future.cancel():
+            self.count("cancelled")
+        self.count("timed_out")
+        return OffloadTimeout(kind, TASK_TIMEOUTS[kind])
+
+    def wait(self, kind, submitted, fallback):
+        """Result of a submitted task, or fallback() when it could not run in the pool"""
+        executor, future, deadline = submitted
+        if future is None:
+            self.count("inline")
+            return fallback()
+        try:
+            result = future.result(timeout=max(deadline - time.time(), 0) + TIMEOUT_GRACE)
+        except OffloadTimeout:
+            self.count("timed_out")
+            raise
+        except TimeoutError:
+            raise self.expire(future, kind)
+        except BrokenProcessPool:
+            # A worker died: replace the pool and answer this request here
+            self.restart(executor)
+            self.count("inline")
+            return fallback()
+        self.count("completed")
+        return result
+
+    def run(self, kind, task, args, fallback):
+        """Result of task(*args) in the pool within the kind's timeout; fallback() without a pool"""
+        return self.wait(kind, self.submit(kind, task, args), fallback)
+
+    async def run_async(self, kind, task, args, fallback):
+        """run() for async endpoints: awaits the pool's future, and a cancelled caller cancels a queued task"""
+        executor, future, deadline = self.submit(kind, task, args)
+        loop = asyncio.get_running_loop()
+        if future is None:
+            self.count("inline")
+            return await loop.run_in_executor(None, fallback)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), max(deadline - time.time(), 0) + TIMEOUT_GRACE)
+        except OffloadTimeout:
+            self.count("timed_out")
+            raise
+        except TimeoutError:
+            raise self.expire(future, kind)
+        except asyncio.CancelledError:
+            if future.cancel():
+                self.count("cancelled")
+            raise
+        except BrokenProcessPool:
+            self.restart(executor)
+            self.count("inline")
+            return await loop.run_in_executor(None, fallback)
+        self.count("completed")
+        return result
+
+    def submit_charts(self, calls):
+        """Submit visualizer charts for {field: (chart name, (df, *args))} together; collect with chart_results"""
+        return {
+            field: self.submit("visualization", chart_task, (name, self.rows(args[0]), list(args[0].columns)) + tuple(args[1:]))
+            for field, (name, args) in calls.items()
+        }
+
+    def chart_results(self, calls, submitted):
+        """{field: chart} for submitted charts; a chart that timed out is None"""
+        results = {}
+        for field, (name, args) in calls.items():
+            try:
+                results[field] = self.wait("visualization", submitted[field], lambda: CHARTS[name](*args))
+            except OffloadTimeout:
+                results[field] = None
+        return results
+
+    def charts(self, calls):
+        return self.chart_results(calls, self.submit_charts(calls))
+
+    def models_changed(self):
+        """Reload models trained in a worker here, and restart the pool so workers load them too"""
+        load_model()
+        load_tsunami_model()
+        risk_cache.clear()
+        self.restart()
+
+    def stats(self):
+        with self.lock:
+            executor = self.executor
+            stats = dict(self.counts)
+        stats["workers"] = self.workers if executor is not None else 0
+        stats["timeouts"] = TASK_TIMEOUTS
+        return stats
+
+offload = Offloader()
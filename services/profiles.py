@@ -0,0 +1,105 @@
+import numpy as np
+
+# Columns identifying one vertical profile, best first; older parquet files lack the float ids
+PROFILE_KEYS = [["platform_number", "cycle_number"], ["time", "latitude", "longitude"]]
+
+def profile_key_columns(df):
+    for keys in PROFILE_KEYS:
+        if all(key in df.columns for key in keys):
+            return keys
+    return None
+
+def sort_profiles(df):
+    """Sort rows by time, then profile, then pressure, so each profile is contiguous"""
+    keys = profile_key_columns(df)
+    if keys is None:
+        return df.sort_values("time", kind="stable", ignore_index=True) if "time" in df.columns else df
+
+    order = (["time"] if "time" in df.columns else []) + [key for key in keys if key != "time"]
+    if "pressure" in df.columns:
+        order.append("pressure")
+    return df.sort_values(order, kind="stable", ignore_index=True)
+
+def assign_profile_ids(df):
+    """Number profiles 0..n-1 in row order; df must already be sorted by sort_profiles"""
+    keys = profile_key_columns(df)
+    if keys is None or df.empty:
+        return None
+
+    change = np.zeros(len(df), dtype=bool)
+    change[0] = True
+    for key in keys:
+        values = df[key].values
+        change[1:] |= values[1:] != values[:-1]
+    return np.cumsum(change) - 1
+
+def segment_starts(profile_ids):
+    """Start position of each run of equal profile ids (works on any ordered subset)"""
+    if len(profile_ids) == 0:
+        return np.zeros(0, dtype=int)
+    return np.concatenate([[0], np.flatnonzero(profile_ids[1:] != profile_ids[:-1]) + 1])
+
+def segment_reduce(values, profile_ids, ufunc=np.add):
+    """ufunc reduction of values within each profile, e.g. np.add, np.minimum, np.maximum"""
+    return ufunc.reduceat(values, segment_starts(profile_ids))
+
+def segment_mean(values, profile_ids):
+    starts = segment_starts(profile_ids)
+    counts = np.diff(np.append(starts, len(values)))
+    return np.add.reduceat(values, starts) / counts
+
+def profile_gradient(values, profile_ids, coords=None):
+    """np.gradient of values within each profile, never across profile boundaries.
+
+    Interior points average the backward and forward differences; profile ends
+    use the one-sided difference; single-point profiles get 0. coords defaults
+    to unit spacing (sample index).
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < 2:
+        return np.zeros(n)
+
+    steps = np.diff(coords).astype(float) if coords is not None else np.ones(n - 1)
+    same_profile = profile_ids[1:] == profile_ids[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        forward = np.where(same_profile & (steps != 0), np.diff(values) / steps, np.nan)
+
+    ahead = np.append(forward, np.nan)
+    behind = np.insert(forward, 0, np.nan)
+    count = (~np.isnan(ahead)).astype(int) + ~np.isnan(behind)
+    total = np.nan_to_num(ahead) + np.nan_to_num(behind)
+    return np.divide(total, count, out=np.zeros(n), where=count > 0)
+
+class ProfileIndex:
+    """Offsets of each profile in the profile-sorted dataset (CSR layout).
+
+    Rows offsets[i]:offsets[i + 1] hold profile i, ordered by pressure.
+    """
+
+    def __init__(self):
+        self.offsets = None
+        self.generation = None
+
+    def build(self, df):
+        self.generation = df.attrs.get("generation")
+        if "profile_id" not in df.columns:
+            self.offsets = None
+            return
+        self.offsets = np.append(segment_starts(df["profile_id"].values), len(df))
+
+    @property
+    def count(self):
+        return 0 if self.offsets is None else len(self.offsets) - 1
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def profile_slice(self, profile):
+        return slice(self.offsets[profile], self.offsets[profile + 1])
+
+    def reduce(self, values, ufunc=np.add):
+        """Per-profile reduction of a full dataset column"""
+        return ufunc.reduceat(values, self.offsets[:-1])
+
+profile_index = ProfileIndex()
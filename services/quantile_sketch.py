@@ -0,0 +1,138 @@
+import numpy as np
+from services.regions import region_registry
+
+LAT_STEP = 10
+LON_STEP = 10
+DEPTH_EDGES = [0, 50, 100, 200, 500, 1000, 2000, np.inf]
+SKETCH_SIZE = 200
+SKETCH_VARIABLES = ["temperature", "salinity"]
+PERCENTILES = [10, 25, 50, 75, 90]
+
+class QuantileSketches:
+    """Mergeable quantile summaries per (lat, lon, depth band) cell and variable.
+
+    Each cell keeps SKETCH_SIZE values taken at evenly spaced mid-ranks of its
+    sorted data, each standing for count / SKETCH_SIZE rows. Such a summary
+    misplaces any rank by at most count / (2 * SKETCH_SIZE), and the bounds add
+    when cells are merged, so a percentile answered from any set of cells is
+    off by at most 1 / (2 * SKETCH_SIZE) of the selected rows (0.25% of rank).
+    Mean and std come from exact per-cell sums. Merging costs
+    O(cells * SKETCH_SIZE), independent of the number of rows.
+    """
+
+    def __init__(self):
+        self.cells = {}
+
+    def build(self, df):
+        self.cells = {}
+        if df.empty or not all(col in df.columns for col in ["latitude", "longitude", "pressure"]):
+            return
+
+        n_lon = int(360 / LON_STEP)
+        n_depth = len(DEPTH_EDGES) - 1
+        lat_bin = np.clip(((df["latitude"].values + 90) // LAT_STEP).astype(int), 0, int(180 / LAT_STEP) - 1)
+        lon_bin = np.clip(((df["longitude"].values + 180) // LON_STEP).astype(int), 0, n_lon - 1)
+        depth_bin = np.clip(np.searchsorted(DEPTH_EDGES, df["pressure"].values, side="right") - 1, 0, n_depth - 1)
+        cell_id = (lat_bin * n_lon + lon_bin) * n_depth + depth_bin
+
+        for variable in SKETCH_VARIABLES:
+            if variable not in df.columns:
+                continue
+
+            values = df[variable].values.astype(float)
+            order = np.lexsort((values, cell_id))
+            sorted_values = values[order]
+            ids, starts, counts = np.unique(cell_id[order], return_index=True, return_counts=True)
+
+            # Mid-rank positions (j + 0.5) / k within every cell, for all cells at once
+            ranks = (np.arange(SKETCH_SIZE) + 0.5) / SKETCH_SIZE
+            positions = starts[:, None] + (ranks[None, :] * counts[:, None]).astype(int)
+
+            depth = ids % n_depth
+            self.cells[variable] = {
+                "lat_bin": ids // n_depth // n_lon,
+                "lon_bin": ids // n_depth % n_lon,
+                "depth_lo": np.array(DEPTH_EDGES)[depth],
+                "depth_hi": np.array(DEPTH_EDGES)[depth + 1],
+                "counts": counts,
+                "sums": np.add.reduceat(sorted_values, starts),
+                "sumsq": np.add.reduceat(sorted_values ** 2, starts),
+                "points": sorted_values[positions]
+            }
+
+    def supports(self, query):
+        """True when the query selects whole cells, so merged sketches answer it"""
+        if query.get("start_time") is not None or query.get("end_time") is not None:
+            return False
+        if query.get("conditions") or query.get("level") is not None:
+            return False
+        if query.get("pressure_range") is not None or query.get("box") is not None:
+            return False
+        if query.get("region") is not None and not self.aligned(region_registry.get(query["region"])):
+            return False
+        if query.get("min_depth") is not None and query["min_depth"] not in DEPTH_EDGES:
+            return False
+        if query.get("max_depth") is not None and query["max_depth"] not in DEPTH_EDGES:
+            return False
+        return True
+
+    def aligned(self, region):
+        """True for boxes whose edges fall on the sketch grid"""
+        if region is None or "polygon" in region:
+            return False
+        return (
+            all(edge % LAT_STEP == 0 for edge in region["lat_range"]) and
+            all(edge % LON_STEP == 0 for edge in region["lon_range"])
+        )
+
+    def region_cells(self, cells, region):
+        lat_lo, lat_hi = [(edge + 90) // LAT_STEP for edge in region["lat_range"]]
+        lon_lo, lon_hi = [(edge + 180) // LON_STEP for edge in region["lon_range"]]
+        in_lat = (cells["lat_bin"] >= lat_lo) & (cells["lat_bin"] < lat_hi)
+        if lon_lo > lon_hi:
+            # Box crossing the antimeridian
+            return in_lat & ((cells["lon_bin"] >= lon_lo) | (cells["lon_bin"] < lon_hi))
+        return in_lat & (cells["lon_bin"] >= lon_lo) & (cells["lon_bin"] < lon_hi)
+
+    def estimate(self, variable, query):
+        """Approximate probabilities for a query, or None if sketches cannot answer it"""
+        cells = self.cells.get(variable)
+        if cells is None or not self.supports(query):
+            return None
+
+        selected = np.ones(len(cells["counts"]), dtype=bool)
+        if query.get("min_depth") is not None:
+            selected &= cells["depth_lo"] >= query["min_depth"]
+        if query.get("max_depth") is not None:
+            selected &= cells["depth_hi"] <= query["max_depth"]
+        if query.get("region") is not None:
+            selected &= self.region_cells(cells, region_registry.get(query["region"]))
+
+        counts = cells["counts"][selected]
+        total = counts.sum()
+        if total == 0:
+            return None
+
+        points = cells["points"][selected].ravel()
+        weights = np.repeat(counts / SKETCH_SIZE, SKETCH_SIZE)
+        order = np.argsort(points, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        targets = np.array(PERCENTILES) / 100 * total
+        percentiles = points[order][np.minimum(np.searchsorted(cumulative, targets), len(points) - 1)]
+
+        mean = cells["sums"][selected].sum() / total
+        std = np.sqrt(max(cells["sumsq"][selected].sum() / total - mean ** 2, 0))
+
+        return {
+            "p10": round(percentiles[0], 2),
+            "p25": round(percentiles[1], 2),
+            "median": round(percentiles[2], 2),
+            "p75": round(percentiles[3], 2),
+            "p90": round(percentiles[4], 2),
+            "mean": round(mean, 2),
+            "std": round(std, 2),
+            "method": "sketch",
+            "max_rank_error": round(1 / (2 * SKETCH_SIZE), 4)
+        }
+
+quantile_sketches = QuantileSketches()
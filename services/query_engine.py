@@ -1,3 +1,119 @@
+import re
+import numpy as np
+import pandas as pd
+from services.regions import region_registry
+from services.derived import derived_columns, extract_conditions, depth_to_pressure, CONDITION_PATTERN, DERIVED_VARIABLES
+from services.standard_levels import standard_levels, nearest_level, STANDARD_LEVELS
+from services.query_planner import query_planner
+
+# Depths, pressures, coordinates and condition values, which can look like years ("at 2000 m")
+MEASUREMENT_PATTERN = re.compile(
+    r"\b(?:between|from) \d+(?:\.\d+)? ?(?:m|dbar)? (?:and|to) \d+(?:\.\d+)? ?(?:m|meters?|metres?|dbar|db|decibars?)\b"
+    r"|\b\d+(?:\.\d+)? ?(?:m|meters?|metres?|km|dbar|db|decibars?)\b"
+    r"|\b(?:lat|lon)(?:itude)? -?\d+(?:\.\d+)? ?(?:to|and|-) ?-?\d+(?:\.\d+)?\b"
+    r"|\b\d+(?:\.\d+)? ?°? ?[nsew]\b"
+)
+
+def extract_time_window(prompt: str, now=None):
+    """Parse a [start, end) time window from the prompt; either bound may be None"""
+    prompt = MEASUREMENT_PATTERN.sub(" ", CONDITION_PATTERN.sub(" ", prompt.lower()))
+    # Day resolution keeps relative windows stable, so repeated prompts share cache entries
+    now = now or pd.Timestamp.now().normalize()
+    year_start = pd.Timestamp(year=now.year, month=1, day=1)
+    month_start = pd.Timestamp(year=now.year, month=now.month, day=1)
+
+    relative = re.search(r"\b(?:last|past) (\d+) (year|month|week|day)s?\b", prompt)
+    if relative:
+        amount, unit = int(relative.group(1)), relative.group(2)
+        offsets = {
+            "year": pd.DateOffset(years=amount),
+            "month": pd.DateOffset(months=amount),
+            "week": pd.DateOffset(weeks=amount),
+            "day": pd.DateOffset(days=amount)
+        }
+        return now - offsets[unit], None
+
+    if "last year" in prompt or "past year" in prompt:
+        return year_start - pd.DateOffset(years=1), year_start
+    if "this year" in prompt:
+        return year_start, None
+    if "last month" in prompt or "past month" in prompt:
+        return month_start - pd.DateOffset(months=1), month_start
+    if "this month" in prompt:
+        return month_start, None
+
+    years = [int(y) for y in re.findall(r"\b(19[5-9]\d|20\d\d)\b", prompt)]
+    if not years:
+        return None, None
+
+    first = pd.Timestamp(year=min(years), month=1, day=1)
+    after_last = pd.Timestamp(year=max(years) + 1, month=1, day=1)
+
+    open_ended = re.search(r"\b(since|from|after|before|until|up to) (?:19|20)\d\d\b", prompt)
+    if open_ended and len(years) == 1:
+        word = open_ended.group(1)
+        if word in ("since", "from"):
+            return first, None
+        if word == "after":
+            return after_last, None
+        if word == "before":
+            return None, first
+        return None, after_last
+
+    return first, after_last
+
+def extract_time_rollup(prompt: str):
+    prompt = prompt.lower()
+    if "monthly" in prompt or "month by month" in prompt or "seasonal" in prompt:
+        return "monthly"
+    if any(word in prompt for word in ["annual", "yearly", "year by year", "per year", "trend"]):
+        return "annual"
+    return None
+
+def extract_level(prompt: str):
+    """Standard pressure level (dbar) named by "at N m" or "at N dbar", or None"""
+    match = re.search(r"\bat (\d+(?:\.\d+)?) ?(m|meters?|metres?|dbar|db|decibars?)\b", prompt.lower())
+    if not match:
+        return None
+    unit = "m" if match.group(2).startswith("m") else "dbar"
+    return float(STANDARD_LEVELS[nearest_level(float(match.group(1)), unit)])
+
+def extract_pressure_range(prompt: str):
+    """(min, max) pressure in dbar from "between 200 and 500 m" or "from 100 to 300 dbar", or None"""
+    match = re.search(r"\b(?:between|from) (\d+(?:\.\d+)?) ?(?:m|dbar)? (?:and|to) (\d+(?:\.\d+)?) ?(m|meters?|metres?|dbar|db|decibars?)\b", prompt.lower())
+    if not match:
+        return None
+    bounds = sorted(float(match.group(i)) for i in (1, 2))
+    if match.group(3).startswith("m"):
+        bounds = [round(float(depth_to_pressure(bound, 45.0)), 1) for bound in bounds]
+    return tuple(bounds)
+
+def extract_coordinate_range(prompt, axis, hemispheres):
+    """(lo, hi) for "lat 10 to 20" or "10s to 5n" style ranges of one axis, or None"""
+    named = re.search(rf"\b{axis}(?:itude)? (-?\d+(?:\.\d+)?) ?(?:to|and|-) ?(-?\d+(?:\.\d+)?)\b", prompt)
+    if named:
+        return float(named.group(1)), float(named.group(2))
+    negative, positive = hemispheres
+    signed = re.search(rf"\b(\d+(?:\.\d+)?) ?°? ?([{negative}{positive}]) ?(?:to|and|-) ?(\d+(?:\.\d+)?) ?°? ?([{negative}{positive}])\b", prompt)
+    if signed:
+        values = [float(signed.group(i)) * (-1 if signed.group(i + 1) == negative else 1) for i in (1, 3)]
+        return values[0], values[1]
+    return None
+
+def extract_box(prompt: str):
+    """(lat_min, lat_max, lon_min, lon_max) from explicit coordinate ranges, or None.
+
+    Latitudes are sorted; longitudes keep their order, so "170e to 170w" crosses the antimeridian.
+    """
+    prompt = prompt.lower()
+    lat = extract_coordinate_range(prompt, "lat", "sn")
+    lon = extract_coordinate_range(prompt, "lon", "we")
+    if lat is None and lon is None:
+        return None
+    lat_min, lat_max = sorted(lat) if lat is not None else (None, None)
+    lon_min, lon_max = lon if lon is not None else (None, None)
+    return lat_min, lat_max, lon_min, lon_max
+
 def parse_prompt(prompt: str):
     prompt = prompt.lower()
 
@@ -6,6 +122,13 @@ def parse_prompt(prompt: str):
         "min_depth": None,
         "max_depth": None,
         "region": None,
+        "start_time": None,
+        "end_time": None,
+        "time_rollup": None,
+        "conditions": (),
+        "level": None,
+        "pressure_range": None,
+        "box": None,
         "query_type": "general"
     }
 
@@ -15,30 +138,217 @@ def parse_prompt(prompt: str):
         return query
 
     # Variable detection
-    if "salinity" in prompt:
+    if "mixed layer" in prompt or "mld" in prompt:
+        query["variable"] = "mixed_layer_depth"
+    elif "thermocline" in prompt:
+        query["variable"] = "thermocline_depth"
+    elif "density" in prompt:
+        query["variable"] = "potential_density"
+    elif "salinity" in prompt:
         query["variable"] = "salinity"
 
-    # Depth detection
-    if "deep" in prompt:
+    # Depth detection ("deeper than 50" is a value condition, not a depth band)
+    depth_words = CONDITION_PATTERN.sub("", prompt)
+    if "deep" in depth_words:
         query["min_depth"] = 1000
-    elif "surface" in prompt:
+    elif "surface" in depth_words:
         query["max_depth"] = 50
 
+    # Standard level, e.g. "temperature at 500 m" (replaces the depth band)
+    level = extract_level(prompt)
+    if level is not None:
+        query["level"] = level
+        query["min_depth"] = query["max_depth"] = None
+
+    # Explicit numbers, e.g. "between 200 and 500 m" or "lat 10 to 20, lon 60 to 80"
+    query["pressure_range"] = extract_pressure_range(prompt)
+    if query["pressure_range"] is not None:
+        query["min_depth"] = query["max_depth"] = None
+    query["box"] = extract_box(prompt)
+
     # Region detection
-    if "antarctica" in prompt or "southern ocean" in prompt:
-        query["region"] = "southern"
+    region = region_registry.find("ocean", prompt)
+    if region:
+        query["region"] = region["key"]
+
+    # Time detection
+    query["start_time"], query["end_time"] = extract_time_window(prompt)
+    query["time_rollup"] = extract_time_rollup(prompt)
+
+    # Value conditions, e.g. "density above 1027" or "mixed layer deeper than 50"
+    query["conditions"] = extract_conditions(prompt)
 
     return query
 
 
-def filter_data(df, query):
+def query_predicates(query):
+    """Atomic filter predicates of a parsed query, in evaluation order"""
+    predicates = []
+    if query.get("level") is not None:
+        predicates.append(("level", query["level"]))
+    if query.get("start_time") is not None or query.get("end_time") is not None:
+        predicates.append(("time", (query["start_time"], query["end_time"])))
     if query["min_depth"] is not None:
-        df = df[df["pressure"] >= query["min_depth"]]
-
+        predicates.append(("min_depth", query["min_depth"]))
     if query["max_depth"] is not None:
-        df = df[df["pressure"] <= query["max_depth"]]
+        predicates.append(("max_depth", query["max_depth"]))
+    if query.get("pressure_range") is not None:
+        predicates.append(("range", ("pressure",) + tuple(query["pressure_range"])))
+    if query.get("box") is not None:
+        lat_min, lat_max, lon_min, lon_max = query["box"]
+        if lat_min is not None or lat_max is not None:
+            predicates.append(("range", ("latitude", lat_min, lat_max)))
+        if lon_min is not None or lon_max is not None:
+            predicates.append(("range", ("longitude", lon_min, lon_max)))
+    if query["region"] is not None:
+        predicates.append(("region", query["region"]))
+    for condition in query.get("conditions", ()):
+        predicates.append(("condition", condition))
+    return tuple(predicates)
+
+def query_columns(query):
+    """Columns a query reads, raw or derived"""
+    return [query["variable"]] + [variable for variable, _, _ in query.get("conditions", ())]
+
+def predicate_mask(df, predicate):
+    """Boolean mask of rows of df satisfying one predicate"""
+    return query_planner.mask(df, predicate)
+
+def plan_query(df, query):
+    """(filtered rows, plan) for a parsed or compiled query, predicates ordered by the planner"""
+    # Derived columns are computed once on the loaded dataset, then filtered like raw ones
+    derived_columns.ensure(query_columns(query))
+    predicates = list(query_predicates(query))
+    if query.get("level") is not None:
+        level_frame = standard_levels.level_frame(query["level"])
+        # A level query reads one interpolated row per profile instead of raw samples
+        if level_frame is not None:
+            df = level_frame
+            predicates.remove(("level", query["level"]))
+    return query_planner.execute(df, predicates)
+
+def filter_data(df, query):
+    return plan_query(df, query)[0]
+
+def filter_batch(df, queries):
+    """Filter many queries at once, equivalent to filter_data per query.
+
+    Each distinct predicate mask is computed once over df, and a query whose
+    predicates extend another's starts from that query's surviving rows, so
+    only the extra predicates are applied.
+    """
+    derived_columns.ensure({column for query in queries for column in query_columns(query)})
+    # Level queries read the standard-level product, not the raw rows masked here
+    if standard_levels.ready and any(query.get("level") is not None for query in queries):
+        raw = [query for query in queries if query.get("level") is None]
+        raw_results = iter(filter_batch(df, raw))
+        return [filter_data(df, query) if query.get("level") is not None else next(raw_results) for query in queries]
+
+    masks = {}
+    selections = {frozenset(): np.arange(len(df))}
+    predicate_sets = [frozenset(query_predicates(query)) for query in queries]
+
+    for target in sorted(set(predicate_sets), key=len):
+        base = max((done for done in selections if done <= target), key=len)
+        positions = selections[base]
+        for predicate in sorted(target - base, key=repr):
+            if predicate not in masks:
+                masks[predicate] = predicate_mask(df, predicate)
+            positions = positions[masks[predicate][positions]]
+        selections[target] = positions
+
+    return [df.iloc[selections[predicates]] for predicates in predicate_sets]
+
+AGGREGATIONS = {
+    "count": len,
+    "mean": np.mean,
+    "min": np.min,
+    "max": np.max,
+    "std": lambda values: np.std(values, ddof=1) if len(values) > 1 else 0.0,
+    "median": np.median,
+    "p10": lambda values: np.percentile(values, 10),
+    "p25": lambda values: np.percentile(values, 25),
+    "p75": lambda values: np.percentile(values, 75),
+    "p90": lambda values: np.percentile(values, 90)
+}
+GROUP_UNITS = {"month": "M", "year": "Y"}
+# Measured and derived variables a structured query may filter and aggregate
+QUERY_VARIABLES = ["temperature", "salinity", "pressure"] + list(DERIVED_VARIABLES)
+
+def compile_query(spec):
+    """Internal query for a structured request (the shape describe_query returns)"""
+    def timestamp(value):
+        if value is None:
+            return None
+        value = pd.Timestamp(value)
+        return value.tz_convert(None) if value.tzinfo is not None else value
+
+    columns = spec["variables"] + [condition["variable"] for condition in spec.get("conditions", [])]
+    unknown = [column for column in columns if column not in QUERY_VARIABLES]
+    if unknown:
+        raise ValueError(f"Unknown variables: {unknown}, expected any of {QUERY_VARIABLES}")
+    if spec.get("region") is not None and region_registry.get(spec["region"]) is None:
+        raise ValueError(f"Unknown region: {spec['region']}")
+    for aggregation in spec["aggregations"]:
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{aggregation}', expected one of {list(AGGREGATIONS)}")
+
+    pressure = (spec.get("pressure_min"), spec.get("pressure_max"))
+    box = (spec.get("lat_min"), spec.get("lat_max"), spec.get("lon_min"), spec.get("lon_max"))
+    level = spec.get("level")
+    return {
+        "variable": spec["variables"][0],
+        "min_depth": None,
+        "max_depth": None,
+        "region": spec.get("region"),
+        "start_time": timestamp(spec.get("start_time")),
+        "end_time": timestamp(spec.get("end_time")),
+        "time_rollup": None,
+        "conditions": tuple(sorted((c["variable"], c["op"], float(c["value"])) for c in spec.get("conditions", []))),
+        "level": None if level is None else float(STANDARD_LEVELS[nearest_level(level)]),
+        "pressure_range": pressure if any(bound is not None for bound in pressure) else None,
+        "box": box if any(bound is not None for bound in box) else None,
+        "query_type": "general"
+    }
+
+def describe_query(query):
+    """Structured form of a parsed prompt, accepted back by compile_query"""
+    pressure_min, pressure_max = query.get("pressure_range") or (query["min_depth"], query["max_depth"])
+    lat_min, lat_max, lon_min, lon_max = query.get("box") or (None, None, None, None)
+    return {
+        "variables": [query["variable"]],
+        "pressure_min": pressure_min,
+        "pressure_max": pressure_max,
+        "lat_min": lat_min,
+        "lat_max": lat_max,
+        "lon_min": lon_min,
+        "lon_max": lon_max,
+        "region": query["region"],
+        "start_time": query["start_time"],
+        "end_time": query["end_time"],
+        "level": query.get("level"),
+        "conditions": [{"variable": variable, "op": op, "value": value} for variable, op, value in query.get("conditions", ())],
+        "aggregations": ["count", "mean", "min", "max"],
+        "group_by": {"monthly": "month", "annual": "year"}.get(query["time_rollup"])
+    }
+
+def aggregate(df, variables, aggregations, group_by=None):
+    """Aggregations of each variable over df, overall or per calendar month/year"""
+    def summarize(frame):
+        result = {}
+        for variable in variables:
+            values = derived_columns.values(frame, variable).astype(float)
+            values = values[~np.isnan(values)]
+            result[variable] = {
+                name: int(len(values)) if name == "count" else (round(float(AGGREGATIONS[name](values)), 4) if len(values) else None)
+                for name in aggregations
+            }
+        return result
 
-    if query["region"] == "southern":
-        df = df[df["latitude"] < -40]
+    if group_by is None or "time" not in df.columns:
+        return summarize(df)
 
-    return df
\ No newline at end of file
+    # Rows are time-ordered, so each period is a contiguous slice
+    periods, starts = np.unique(df["time"].values.astype(f"datetime64[{GROUP_UNITS[group_by]}]"), return_index=True)
+    ends = np.append(starts[1:], len(df))
+    return [{"period": str(period), **summarize(df.iloc[start:end])} for period, start, end in zip(periods, starts, ends)]
@@ -0,0 +1,196 @@
+import threading
+import numpy as np
+from services.time_index import time_index
+from services.regions import region_registry, points_in_region
+from services.derived import derived_columns
+from services.standard_levels import level_band
+
+STATS_BUCKETS = 64
+STATS_COLUMNS = ["latitude", "longitude", "pressure", "temperature", "salinity"]
+
+def column_bounds(predicate):
+    """(column, lo, hi, strict) for predicates that bound a single column, else None"""
+    name, value = predicate
+    if name == "min_depth":
+        return "pressure", value, None, False
+    if name == "max_depth":
+        return "pressure", None, value, False
+    if name == "level":
+        return ("pressure",) + level_band(value) + (False,)
+    if name == "range":
+        column, lo, hi = value
+        return column, lo, hi, False
+    if name == "condition":
+        variable, op, bound = value
+        return (variable, bound, None, True) if op == ">" else (variable, None, bound, True)
+    return None
+
+def bounds_mask(values, lo, hi, strict=False):
+    """Rows within [lo, hi] (open bounds when strict); lo > hi wraps, as for longitudes across the antimeridian"""
+    above = np.ones(len(values), dtype=bool) if lo is None else (values > lo if strict else values >= lo)
+    below = np.ones(len(values), dtype=bool) if hi is None else (values < hi if strict else values <= hi)
+    if lo is not None and hi is not None and lo > hi:
+        return above | below
+    return above & below
+
+class ColumnStats:
+    """Equi-depth histogram of one column, for range selectivity estimates"""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.count = len(values)
+        self.quantiles = np.linspace(0, 1, STATS_BUCKETS + 1)
+        self.edges = np.quantile(values, self.quantiles) if self.count else np.zeros(STATS_BUCKETS + 1)
+
+    def cdf(self, value):
+        return float(np.interp(value, self.edges, self.quantiles))
+
+    def fraction(self, lo, hi):
+        below_hi = 1.0 if hi is None else self.cdf(hi)
+        below_lo = 0.0 if lo is None else self.cdf(lo)
+        if lo is not None and hi is not None and lo > hi:
+            return 1.0 - below_lo + below_hi
+        return max(below_hi - below_lo, 0.0)
+
+class QueryPlanner:
+    """Orders a query's predicates by estimated selectivity and evaluates them on shrinking row sets.
+
+    Selectivity comes from per-column equi-depth histograms, the time index
+    and the region label masks of the loaded dataset. The most selective
+    predicate produces the first candidate rows through an index when one
+    applies (time slice, region mask, or a sorted column index); every later
+    predicate is evaluated only on the surviving row positions.
+    """
+
+    def __init__(self):
+        self.df = None
+        self.stats = {}
+        self.sorted = {}
+        self.region_fractions = {}
+        self.lock = threading.Lock()
+
+    def build(self, df):
+        self.df = df
+        self.stats = {}
+        self.sorted = {}
+        self.region_fractions = {}
+        for column in STATS_COLUMNS:
+            if column in df.columns:
+                self.stats[column] = ColumnStats(df[column].values)
+
+    def is_dataset(self, df):
+        return self.df is not None and df is self.df
+
+    def column_stats(self, column):
+        """Histogram of a dataset column; derived columns get theirs on first use"""
+        if column not in self.stats and self.df is not None and derived_columns.supports(self.df, column):
+            with self.lock:
+                if column not in self.stats:
+                    self.stats[column] = ColumnStats(derived_columns.values(self.df, column))
+        return self.stats.get(column)
+
+    def sorted_index(self, column):
+        """(row order, sorted values) of a dataset column, built on first use"""
+        if column not in self.sorted:
+            with self.lock:
+                if column not in self.sorted:
+                    values = derived_columns.values(self.df, column)
+                    order = np.argsort(values, kind="stable")
+                    self.sorted[column] = (order, values[order])
+        return self.sorted[column]
+
+    def selectivity(self, predicate):
+        """Estimated fraction of dataset rows satisfying a predicate"""
+        name, value = predicate
+        bounds = column_bounds(predicate)
+        if bounds is not None:
+            stats = self.column_stats(bounds[0])
+            return stats.fraction(bounds[1], bounds[2]) if stats is not None and stats.count else 0.5
+        if name == "time" and time_index.times is not None and len(time_index.times):
+            window = time_index.slice(*value)
+            return (window.stop - window.start) / len(time_index.times)
+        if name == "region" and value in region_registry.masks:
+            if value not in self.region_fractions:
+                self.region_fractions[value] = float(region_registry.masks[value].mean())
+            return self.region_fractions[value]
+        return 1.0
+
+    def mask(self, df, predicate, positions=None):
+        """Predicate over the rows of df, or only over the given row positions"""
+        name, value = predicate
+        bounds = column_bounds(predicate)
+        if bounds is not None:
+            column, lo, hi, strict = bounds
+            values = derived_columns.values(df, column)
+            return bounds_mask(values if positions is None else values[positions], lo, hi, strict)
+
+        if name == "time":
+            if positions is None and time_index.covers(df):
+                mask = np.zeros(len(df), dtype=bool)
+                mask[time_index.slice(*value)] = True
+                return mask
+            if "time" not in df.columns:
+                return np.zeros(len(df) if positions is None else len(positions), dtype=bool)
+            times = df["time"].values if positions is None else df["time"].values[positions]
+            start, end = value
+            mask = np.ones(len(times), dtype=bool)
+            if start is not None:
+                mask &= times >= np.datetime64(start)
+            if end is not None:
+                mask &= times < np.datetime64(end)
+            return mask
+
+        if name == "region":
+            if positions is None:
+                return region_registry.mask(df, value)
+            if self.is_dataset(df) and value in region_registry.masks:
+                return region_registry.mask(df, value)[positions]
+            return points_in_region(df["latitude"].values[positions], df["longitude"].values[positions], region_registry.get(value))
+
+        raise ValueError(f"Unknown predicate: {name}")
+
+    def candidates(self, df, predicate):
+        """(row positions, access path) of the first predicate, through an index when df is the loaded dataset"""
+        name, value = predicate
+        if self.is_dataset(df):
+            if name == "time" and time_index.covers(df):
+                window = time_index.slice(*value)
+                return np.arange(window.start, window.stop), "time_index"
+            if name == "region" and value in region_registry.masks:
+                return np.flatnonzero(region_registry.mask(df, value)), "region_index"
+            bounds = column_bounds(predicate)
+            if bounds is not None and derived_columns.supports(df, bounds[0]):
+                column, lo, hi, strict = bounds
+                order, values = self.sorted_index(column)
+                start = 0 if lo is None else np.searchsorted(values, lo, side="right" if strict else "left")
+                stop = len(values) if hi is None else np.searchsorted(values, hi, side="left" if strict else "right")
+                if lo is not None and hi is not None and lo > hi:
+                    found = np.concatenate([order[start:], order[:stop]])
+                else:
+                    found = order[start:max(start, stop)]
+                # Back to dataset order, so time-sorted rows and profiles stay contiguous
+                return np.sort(found), "sorted_index"
+        return np.flatnonzero(self.mask(df, predicate)), "scan"
+
+    def execute(self, df, predicates):
+        """(filtered rows, plan) for predicates applied most selective first"""
+        estimates = {predicate: self.selectivity(predicate) for predicate in predicates}
+        positions = None
+        plan = []
+        for predicate in sorted(predicates, key=lambda predicate: estimates[predicate]):
+            rows_in = len(df) if positions is None else len(positions)
+            if positions is None:
+                positions, access = self.candidates(df, predicate)
+            else:
+                positions, access = positions[self.mask(df, predicate, positions)], "filter"
+            plan.append({
+                "predicate": list(predicate),
+                "estimated_selectivity": round(estimates[predicate], 4),
+                "access": access,
+                "rows_in": rows_in,
+                "rows_out": int(len(positions))
+            })
+        return (df if positions is None else df.iloc[positions]), plan
+
+query_planner = QueryPlanner()
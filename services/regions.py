@@ -0,0 +1,124 @@
+import os
+import json
+import numpy as np
+from pathlib import Path
+
+REGIONS_CONFIG = Path(os.getenv("FLOATCHAT_REGIONS", Path(__file__).resolve().parent.parent / "config" / "regions.json"))
+
+def unwrap_longitudes(lon, west):
+    """Shift longitudes into [west, west + 360) so dateline-crossing shapes are contiguous"""
+    return (lon - west) % 360 + west
+
+def region_bounds(region):
+    """(lat_min, lat_max, west, east) with east > west possibly beyond 180"""
+    if "polygon" in region:
+        vertices = np.array(region["polygon"], dtype=float)
+        return vertices[:, 1].min(), vertices[:, 1].max(), vertices[:, 0].min(), vertices[:, 0].max()
+
+    west, east = region["lon_range"]
+    if west > east:
+        # Box crossing the antimeridian, e.g. (120, -70)
+        east += 360
+    return region["lat_range"][0], region["lat_range"][1], west, east
+
+def points_in_polygon(lat, lon, polygon):
+    """Even-odd ray casting over all points at once; polygon is [[lon, lat], ...]"""
+    vertices = np.array(polygon, dtype=float)
+    x1, y1 = vertices[:, 0], vertices[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    inside = np.zeros(len(lat), dtype=bool)
+    for ax, ay, bx, by in zip(x1, y1, x2, y2):
+        crosses = (ay > lat) != (by > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at_lat = ax + (lat - ay) * (bx - ax) / (by - ay)
+        inside ^= crosses & (lon < x_at_lat)
+    return inside
+
+def points_in_region(lat, lon, region):
+    """Boolean membership of lat/lon arrays, bounding-box prefiltered"""
+    lat_min, lat_max, west, east = region_bounds(region)
+    lon = unwrap_longitudes(lon, west) if east > 180 else lon
+
+    in_box = (lat >= lat_min) & (lat <= lat_max) & (lon >= west) & (lon <= east)
+    if "polygon" not in region:
+        return in_box
+
+    candidates = np.flatnonzero(in_box)
+    inside = np.zeros(len(lat), dtype=bool)
+    inside[candidates] = points_in_polygon(lat[candidates], lon[candidates], region["polygon"])
+    return inside
+
+class RegionRegistry:
+    """Named regions loaded from config, with membership cached per dataset generation.
+
+    Regions are boxes ("lat_range"/"lon_range", where a lon_range with
+    west > east crosses the antimeridian) or polygons ("polygon" as
+    [[lon, lat], ...], longitudes may exceed 180 to cross the dateline).
+    """
+
+    def __init__(self, path=REGIONS_CONFIG):
+        self.path = Path(path)
+        self.groups = {}
+        self.regions = {}
+        self.generation = None
+        self.masks = {}
+        self.load()
+
+    def load(self):
+        with open(self.path) as f:
+            config = json.load(f)
+
+        self.groups = {}
+        self.regions = {}
+        for group, regions in config.items():
+            self.groups[group] = []
+            for region in regions:
+                if "polygon" not in region and not ("lat_range" in region and "lon_range" in region):
+                    raise ValueError(f"Region {region.get('key')} needs a polygon or lat/lon ranges")
+                self.groups[group].append(region)
+                self.regions[region["key"]] = region
+        self.masks = {}
+
+    def get(self, key):
+        return self.regions.get(key)
+
+    def group(self, name):
+        return self.groups.get(name, [])
+
+    def find(self, group, prompt):
+        """First region of the group whose keywords appear in the prompt"""
+        prompt_lower = prompt.lower()
+        for region in self.group(group):
+            if any(keyword in prompt_lower for keyword in region.get("keywords", [])):
+                return region
+        return None
+
+    def label(self, df):
+        """Compute membership of every region for the loaded dataset, once"""
+        self.generation = df.attrs.get("generation")
+        self.masks = {}
+        if df.empty or "latitude" not in df.columns or "longitude" not in df.columns:
+            return
+
+        lat = df["latitude"].values
+        lon = df["longitude"].values
+        for key, region in self.regions.items():
+            self.masks[key] = points_in_region(lat, lon, region)
+
+    def mask(self, df, key):
+        """Boolean membership for df rows; a lookup for frames derived from the labelled dataset"""
+        if key in self.masks and self.generation is not None and df.attrs.get("generation") == self.generation:
+            # load_data() gives a RangeIndex, so row labels of derived frames are positions
+            return self.masks[key][df.index.values]
+        return points_in_region(df["latitude"].values, df["longitude"].values, self.regions[key])
+
+region_registry = RegionRegistry()
+
+def get_region(key):
+    """Return region definition or None"""
+    return region_registry.get(key)
+
+def region_mask(df, region):
+    """Boolean mask of rows inside a registered region"""
+    return region_registry.mask(df, region["key"])
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+def estimate_cost(value):
+    """Approximate in-memory size of a JSON-like result, in bytes"""
+    if isinstance(value, str):
+        return len(value) + 50
+    if isinstance(value, dict):
+        return 64 + sum(estimate_cost(k) + estimate_cost(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(estimate_cost(v) for v in value)
+    return 32
+
+class ResultCache:
+    """Size-bounded LRU cache of analysis results with hit-rate metrics.
+
+    Keys must include the dataset generation so reloads never serve stale results.
+    """
+
+    def __init__(self, max_cost=RESULT_CACHE_MAX_BYTES):
+        self.max_cost = max_cost
+        self.entries = OrderedDict()
+        self.cost = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+
+    def put(self, key, value):
+        cost = estimate_cost(value)
+        if cost > self.max_cost:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.cost -= self.entries.pop(key)[1]
+            self.entries[key] = (value, cost)
+            self.cost += cost
+
+            while self.cost > self.max_cost:
+                _, (_, evicted_cost) = self.entries.popitem(last=False)
+                self.cost -= evicted_cost
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.cost = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "cost_bytes": self.cost,
+                "max_cost_bytes": self.max_cost,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+result_cache = ResultCache()
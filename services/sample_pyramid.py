@@ -0,0 +1,86 @@
+import numpy as np
+from services.profiles import segment_starts
+
+# Level k keeps one profile per (BASE_CELL / 2**k)° lat/lon cell; profiles kept at no level only appear at full detail
+BASE_CELL = 20
+PYRAMID_LEVELS = 8
+SAMPLE_SEED = 0
+
+def unit_levels(latitude, longitude, priority):
+    """Coarsest pyramid level of each sampling unit.
+
+    A unit is kept at level k when it has the lowest priority in its level-k
+    cell. Cells nest, so a unit kept at level k is also kept at every finer
+    level and each level is a superset of the one above it.
+    """
+    levels = np.full(len(latitude), PYRAMID_LEVELS)
+    for k in range(PYRAMID_LEVELS):
+        size = BASE_CELL / 2 ** k
+        n_lon = int(np.ceil(360 / size))
+        cell = ((latitude + 90) // size).astype(np.int64) * n_lon + ((longitude + 180) // size).astype(np.int64)
+        order = np.lexsort((priority, cell))
+        kept = order[segment_starts(cell[order])]
+        levels[kept] = np.minimum(levels[kept], k)
+    return levels
+
+def pyramid_ranks(df):
+    """(level, rank) of every row of df: whole profiles when profile_id is present, else single rows"""
+    if "profile_id" in df.columns:
+        profile_ids = df["profile_id"].values
+        starts = segment_starts(profile_ids)
+        unit = np.zeros(len(df), dtype=np.int64)
+        unit[starts[1:]] = 1
+        unit = np.cumsum(unit)
+    else:
+        starts = np.arange(len(df))
+        unit = starts
+
+    priority = np.random.default_rng(SAMPLE_SEED).permutation(len(starts))
+    levels = unit_levels(df["latitude"].values[starts], df["longitude"].values[starts], priority)
+    # Global order: coarse levels first, random but fixed order within a level
+    rank = np.empty(len(starts), dtype=np.int64)
+    rank[np.lexsort((priority, levels))] = np.arange(len(starts))
+    return levels[unit], rank[unit]
+
+class SamplePyramid:
+    """Precomputed multi-resolution, spatially thinned sample of the loaded dataset.
+
+    Charts take the densest pyramid level that fits their point budget from
+    whatever rows a query selected, so the same selection always plots the
+    same points and the plotted count never exceeds the budget.
+    """
+
+    def __init__(self):
+        self.generation = None
+        self.levels = None
+        self.ranks = None
+
+    def build(self, df):
+        self.generation = df.attrs.get("generation")
+        self.levels = self.ranks = None
+        if not df.empty and "latitude" in df.columns and "longitude" in df.columns:
+            self.levels, self.ranks = pyramid_ranks(df)
+
+    def lookup(self, df):
+        """Levels and ranks for the rows of df, by row label when df comes from the built dataset"""
+        if self.levels is not None and self.generation is not None and df.attrs.get("generation") == self.generation:
+            index = df.index.values
+            return self.levels[index], self.ranks[index]
+        return pyramid_ranks(df)
+
+    def sample(self, df, budget):
+        """Rows of df at the densest pyramid level with at most budget rows.
+
+        The rest of the budget is filled from the next level down in its fixed
+        rank order, so the result is always the same prefix of the pyramid.
+        """
+        if len(df) <= budget or "latitude" not in df.columns or "longitude" not in df.columns:
+            return df
+
+        _, ranks = self.lookup(df)
+        # Rows per unit in rank order; the kept units are the longest prefix within budget
+        rows = np.bincount(ranks)
+        keep = max(1, int(np.searchsorted(np.cumsum(rows), budget, side="right")))
+        return df[ranks < keep]
+
+sample_pyramid = SamplePyramid()
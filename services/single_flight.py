@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+def normalize_prompt(prompt):
+    """Case- and whitespace-insensitive form of a prompt, for coalescing keys"""
+    return " ".join(prompt.lower().split())
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+        # (loop, future) of async followers, resolved from the leader's thread
+        self.waiters = []
+
+def settle(waiter, flight):
+    # The follower may have gone away (client disconnected) and cancelled its future
+    if waiter.done():
+        return
+    if flight.error is not None:
+        waiter.set_exception(flight.error)
+    else:
+        waiter.set_result(flight.result)
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for it and receive the same result (or exception). Nothing is
+    kept once the call finishes, so this only merges in-flight duplicates;
+    results shared between callers must be treated as read-only. Async
+    callers use follow() to wait on the event loop instead of a thread.
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, function, *args):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.leaders += 1
+            else:
+                flight.followers += 1
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function(*args)
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                waiters = flight.waiters
+            flight.done.set()
+            for loop, waiter in waiters:
+                loop.call_soon_threadsafe(settle, waiter, flight)
+        return flight.result
+
+    def follow(self, key):
+        """Future for the result of key's in-flight call, to await on the event loop; None when nothing is in flight.
+
+        Checking and joining happen under one lock, so a None means the
+        caller computes the result itself, like any other first caller.
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is None:
+                return None
+            flight.followers += 1
+            self.coalesced += 1
+            waiter = loop.create_future()
+            flight.waiters.append((loop, waiter))
+        return waiter
+
+    def stats(self):
+        with self.lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "in_flight": len(self.flights),
+                "computations": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / calls, 3) if calls else 0.0
+            }
+
+single_flight = SingleFlight()
@@ -0,0 +1,172 @@
+import threading
+import numpy as np
+from services.climatology import climatology, CLIMATOLOGY_VARIABLES
+from services.derived import derived_columns, pressure_to_depth, DERIVED_VARIABLES
+from services.regions import points_in_region
+from services.profiles import segment_starts
+
+# Standard pressure levels in dbar (denser near the surface, like the WOA standard depths)
+STANDARD_LEVELS = np.array([
+    5, 10, 20, 30, 50, 75, 100, 125, 150, 200, 250, 300, 400, 500,
+    600, 700, 800, 900, 1000, 1100, 1200, 1300, 1400, 1500, 1750, 2000
+], dtype=float)
+LEVEL_VARIABLES = ["temperature", "salinity"]
+
+def nearest_level(value, unit="dbar"):
+    """Index of the standard level closest to a pressure (dbar) or a depth (m, at mid-latitude)"""
+    levels = STANDARD_LEVELS if unit == "dbar" else pressure_to_depth(STANDARD_LEVELS, 45.0)
+    return int(np.argmin(np.abs(levels - value)))
+
+def level_band(level):
+    """Pressure range halfway to the neighbouring levels, for frames without a level product"""
+    i = int(np.searchsorted(STANDARD_LEVELS, level))
+    lo = (STANDARD_LEVELS[i - 1] + level) / 2 if i > 0 else 0
+    hi = (STANDARD_LEVELS[i + 1] + level) / 2 if i + 1 < len(STANDARD_LEVELS) else level
+    return lo, hi
+
+def interpolate_profiles(pressure, values, offsets, levels):
+    """Linear interpolation of every profile onto levels, NaN outside each profile's range.
+
+    Rows are profile-contiguous and pressure-sorted, so one searchsorted on a
+    (profile, pressure) composite key finds every bracketing pair at once.
+    """
+    n_profiles = len(offsets) - 1
+    profile = np.repeat(np.arange(n_profiles), np.diff(offsets))
+    stride = max(float(pressure.max()), float(levels.max())) + 1.0
+    keys = profile * stride + pressure
+    targets = (np.arange(n_profiles)[:, None] * stride + levels[None, :]).ravel()
+
+    upper = np.searchsorted(keys, targets, side="left")
+    starts = np.repeat(offsets[:-1], len(levels))
+    ends = np.repeat(offsets[1:], len(levels))
+    target_pressure = np.tile(levels, n_profiles)
+
+    inside = upper < ends
+    exact = inside & (pressure[np.minimum(upper, len(pressure) - 1)] == target_pressure)
+    bracketed = inside & ~exact & (upper > starts)
+    result = np.full(len(targets), np.nan)
+
+    result[exact] = values[upper[exact]]
+    hi, lo = upper[bracketed], upper[bracketed] - 1
+    span = pressure[hi] - pressure[lo]
+    weight = np.divide(target_pressure[bracketed] - pressure[lo], span, out=np.zeros(len(span)), where=span > 0)
+    result[bracketed] = values[lo] + weight * (values[hi] - values[lo])
+    return result.reshape(n_profiles, len(levels))
+
+class StandardLevels:
+    """Every profile interpolated onto STANDARD_LEVELS, as profiles × levels arrays.
+
+    Built once per dataset generation. A depth slice is one column, a section
+    is a block of rows and a vertical mean is a weighted row reduction, so
+    their cost depends on the number of profiles, not on raw sample density.
+    """
+
+    def __init__(self):
+        self.df = None
+        self.generation = None
+        self.offsets = None
+        self.grids = {}
+        self.profiles = None
+        self.frames = {}
+        self.lock = threading.Lock()
+
+    def build(self, df):
+        self.df = df
+        self.generation = df.attrs.get("generation")
+        self.offsets = None
+        self.grids = {}
+        self.profiles = None
+        self.frames = {}
+        if df.empty or "profile_id" not in df.columns:
+            return
+
+        self.offsets = np.append(segment_starts(df["profile_id"].values), len(df))
+        pressure = df["pressure"].values.astype(float)
+        for variable in LEVEL_VARIABLES:
+            if variable in df.columns:
+                self.grids[variable] = interpolate_profiles(pressure, df[variable].values.astype(float), self.offsets, STANDARD_LEVELS)
+
+        # One row of position metadata per profile, taken from its first sample
+        first = self.offsets[:-1]
+        columns = [col for col in ["time", "latitude", "longitude", "profile_id"] if col in df.columns]
+        self.profiles = df[columns].iloc[first].reset_index(drop=True)
+        # pandas carries attrs through iloc and copy; level frames are not dataset rows, so drop the generation
+        self.profiles.attrs = {}
+
+    @property
+    def ready(self):
+        return self.offsets is not None and bool(self.grids)
+
+    def select(self, region=None, start=None, end=None):
+        """Profile positions inside a region and [start, end) time window"""
+        selected = np.ones(len(self.profiles), dtype=bool)
+        if region is not None:
+            selected &= points_in_region(self.profiles["latitude"].values, self.profiles["longitude"].values, region)
+        if "time" in self.profiles.columns:
+            if start is not None:
+                selected &= (self.profiles["time"] >= start).values
+            if end is not None:
+                selected &= (self.profiles["time"] < end).values
+        return np.flatnonzero(selected)
+
+    def depth_slice(self, variable, level_index, profiles=None):
+        """Values of variable at one standard level for the selected profiles"""
+        column = self.grids[variable][:, level_index]
+        return column if profiles is None else column[profiles]
+
+    def section(self, variable, profiles, along="longitude"):
+        """(profiles × levels) block for the selected profiles, ordered along latitude or longitude"""
+        order = profiles[np.argsort(self.profiles[along].values[profiles], kind="stable")]
+        return order, self.grids[variable][order]
+
+    def vertical_mean(self, variable, top=None, bottom=None, profiles=None):
+        """Thickness-weighted mean between two pressures; NaN for profiles not covering the whole layer"""
+        lo = 0 if top is None else int(np.searchsorted(STANDARD_LEVELS, top, side="left"))
+        hi = len(STANDARD_LEVELS) if bottom is None else int(np.searchsorted(STANDARD_LEVELS, bottom, side="right"))
+        grid = self.grids[variable] if profiles is None else self.grids[variable][profiles]
+        block, levels = grid[:, lo:hi], STANDARD_LEVELS[lo:hi]
+        if len(levels) < 2:
+            return block[:, 0] if len(levels) else np.full(len(grid), np.nan)
+
+        # Trapezoidal weights: each level stands for half of the layers on either side
+        gaps = np.diff(levels)
+        weights = np.append(gaps, 0) / 2 + np.insert(gaps, 0, 0) / 2
+        return block @ weights / weights.sum()
+
+    def level_frame(self, level):
+        """One row per profile with valid values at the level, shaped like the raw dataset.
+
+        The frame's attrs are empty (no dataset generation), so lookups keyed by
+        dataset row labels never treat its profile index as dataset positions.
+        Derived point variables are computed on the frame; whole-profile ones are
+        copied from the dataset. Frames are cached and shared, so every column
+        is added before the frame is first returned.
+        """
+        if not self.ready:
+            return None
+
+        level_index = int(np.argmin(np.abs(STANDARD_LEVELS - level)))
+        with self.lock:
+            frame = self.frames.get(level_index)
+            if frame is None:
+                frame = self.profiles.copy()
+                frame["pressure"] = STANDARD_LEVELS[level_index]
+                for variable, grid in self.grids.items():
+                    frame[variable] = grid[:, level_index]
+                frame = frame.dropna(subset=list(self.grids)).reset_index(drop=True)
+                frame.attrs = {}
+                for variable in CLIMATOLOGY_VARIABLES:
+                    if variable in frame.columns and climatology.supports(frame):
+                        frame[f"{variable}_z"] = climatology.zscores(frame, variable)
+                for name, (_, _, _, _, whole_profile) in DERIVED_VARIABLES.items():
+                    if not derived_columns.supports(self.df, name):
+                        continue
+                    if whole_profile:
+                        starts = self.offsets[:-1][frame["profile_id"].values]
+                        frame[name] = derived_columns.values(self.df, name)[starts]
+                    else:
+                        frame[name] = derived_columns.compute(frame, name)
+                self.frames[level_index] = frame
+        return frame
+
+standard_levels = StandardLevels()
@@ -0,0 +1,101 @@
+import numpy as np
+from services.regions import region_registry
+
+ROLLUP_VARIABLES = ["temperature", "salinity"]
+
+class TimeIndex:
+    """Sorted time index with precomputed monthly/annual rollups per region.
+
+    Relies on load_data() returning rows sorted by time, so any time window
+    is a contiguous slice found by binary search.
+    """
+
+    def __init__(self):
+        self.df = None
+        self.times = None
+        self.rollups = {}
+
+    def build(self, df):
+        self.df = df
+        self.times = None
+        self.rollups = {}
+
+        if df.empty or "time" not in df.columns:
+            return
+
+        self.times = df["time"].values
+
+        region_masks = {"global": None}
+        if "latitude" in df.columns and "longitude" in df.columns:
+            for region in region_registry.group("ocean"):
+                region_masks[region["key"]] = region_registry.mask(df, region["key"])
+
+        for key, mask in region_masks.items():
+            self.rollups[key] = {
+                "monthly": self._rollup(mask, "M"),
+                "annual": self._rollup(mask, "Y")
+            }
+
+    def _rollup(self, mask, unit):
+        times = self.times if mask is None else self.times[mask]
+        if len(times) == 0:
+            return []
+
+        # Times are sorted, so periods are too: group boundaries come straight from np.unique
+        periods, starts, counts = np.unique(times.astype(f"datetime64[{unit}]"), return_index=True, return_counts=True)
+
+        columns = {}
+        for variable in ROLLUP_VARIABLES:
+            if variable in self.df.columns:
+                values = self.df[variable].values if mask is None else self.df[variable].values[mask]
+                columns[variable] = np.add.reduceat(values, starts) / counts
+
+        rollup = []
+        for i, period in enumerate(periods):
+            entry = {"period": str(period), "count": int(counts[i])}
+            for variable, means in columns.items():
+                entry[variable] = round(float(means[i]), 3)
+            rollup.append(entry)
+        return rollup
+
+    def covers(self, df):
+        return self.times is not None and df is self.df
+
+    def slice(self, start=None, end=None):
+        """Positional slice for [start, end) via binary search"""
+        lo = 0 if start is None else int(np.searchsorted(self.times, np.datetime64(start), side="left"))
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, np.datetime64(end), side="left"))
+        return slice(lo, max(lo, hi))
+
+    def select(self, df, start=None, end=None):
+        """Rows of df within [start, end)"""
+        if self.covers(df):
+            return df.iloc[self.slice(start, end)]
+
+        if "time" not in df.columns:
+            return df.iloc[0:0]
+
+        mask = np.ones(len(df), dtype=bool)
+        if start is not None:
+            mask &= (df["time"] >= start).values
+        if end is not None:
+            mask &= (df["time"] < end).values
+        return df[mask]
+
+    def rollup(self, region=None, freq="annual", start=None, end=None):
+        """Precomputed time series for a region, optionally clipped to [start, end)"""
+        series = self.rollups.get(region or "global", {}).get(freq, [])
+        if start is None and end is None:
+            return series
+
+        unit = "M" if freq == "monthly" else "Y"
+        lo = str(np.datetime64(start).astype(f"datetime64[{unit}]")) if start is not None else None
+        # end is exclusive, so the last period is the one containing the instant before it
+        hi = str((np.datetime64(end) - np.timedelta64(1, "us")).astype(f"datetime64[{unit}]")) if end is not None else None
+        # ISO period strings sort chronologically
+        return [
+            entry for entry in series
+            if (lo is None or entry["period"] >= lo) and (hi is None or entry["period"] <= hi)
+        ]
+
+time_index = TimeIndex()
@@ -2,8 +2,11 @@ import numpy as np
 import pandas as pd
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import train_test_split
 import pickle
 from pathlib import Path
+from services.regions import region_registry, points_in_region
+from services.profiles import profile_gradient
 
 tsunami_model = None
 scaler = None
@@ -42,62 +45,199 @@ def calculate_tsunami_risk_score(df_region):
             risk_score += 25
     
     # Depth profile irregularities
-    if "pressure" in df_region.columns:
-        depth_gradient = np.gradient(df_region["pressure"].values)
+    if "pressure" in df_region.columns and len(df_region) > 1:
+        if "profile_id" in df_region.columns:
+            depth_gradient = profile_gradient(df_region["pressure"].values, df_region["profile_id"].values)
+        else:
+            depth_gradient = np.gradient(df_region["pressure"].values)
         if np.std(depth_gradient) > 100:
             risk_score += 10
     
     return min(risk_score, 100)
 
-def analyze_tsunami_risk_by_region(df):
-    """Analyze tsunami risk for different geographic regions"""
+RISK_FEATURES = ["pressure_std", "temp_mean", "temp_std", "salinity_std", "gradient_std"]
+TRAINING_CELL_SIZE = 5
+MIN_CELL_POINTS = 10
+EXPOSED_BASE_RISK = 25
+
+risk_cache = {}
+
+def indicator_matrix(df, groups):
+    """Per-group risk indicators (one row per group, columns RISK_FEATURES) in one groupby"""
+    frame = pd.DataFrame({"group": groups})
+    for column in ["pressure", "temperature", "salinity"]:
+        frame[column] = df[column].values if column in df.columns else 0.0
+    
+    grouped = frame.groupby("group", sort=True)
+    features = grouped.agg(
+        pressure_std=("pressure", "std"),
+        temp_mean=("temperature", "mean"),
+        temp_std=("temperature", "std"),
+        salinity_std=("salinity", "std"),
+        count=("pressure", "size")
+    )
+    # Spread of consecutive pressure steps within each group and profile (the "depth profile irregularity" indicator)
+    frame["pressure_step"] = grouped["pressure"].diff()
+    if "profile_id" in df.columns:
+        frame["profile_id"] = df["profile_id"].values
+        frame.loc[frame.groupby("group", sort=True)["profile_id"].diff() != 0, "pressure_step"] = np.nan
+    features["gradient_std"] = frame.groupby("group", sort=True)["pressure_step"].std()
+    return features.fillna(0)
+
+def cell_groups(df):
+    """TRAINING_CELL_SIZE degree cell id of every row"""
+    lat_bin = np.floor(df["latitude"].values / TRAINING_CELL_SIZE).astype(int)
+    lon_bin = np.floor(df["longitude"].values / TRAINING_CELL_SIZE).astype(int)
+    return lat_bin * 1000 + lon_bin
+
+def cell_features(df, groups):
+    """Indicators of cells with at least MIN_CELL_POINTS rows, indexed by cell id"""
+    features = indicator_matrix(df, groups)
+    return features[features["count"] >= MIN_CELL_POINTS]
+
+def training_set(df):
+    """Feature vectors of TRAINING_CELL_SIZE degree cells, labelled by historical exposure.
+
+    There is no event catalogue in the dataset, so a cell is positive when its
+    centre lies in a configured tsunami region with base_risk >= EXPOSED_BASE_RISK.
+    The features carry no position, so the model can only learn which ocean
+    conditions accompany exposed coasts; held-out accuracy against the
+    majority-class rate shows how much of that it manages.
+    """
+    features = cell_features(df, cell_groups(df))
+    
+    cell_lat = (np.floor_divide(features.index.values + 500, 1000) + 0.5) * TRAINING_CELL_SIZE
+    cell_lon = (features.index.values - np.floor_divide(features.index.values + 500, 1000) * 1000 + 0.5) * TRAINING_CELL_SIZE
+    
+    labels = np.zeros(len(features), dtype=int)
+    for region in region_registry.group("tsunami"):
+        if region["base_risk"] >= EXPOSED_BASE_RISK:
+            labels |= points_in_region(cell_lat, cell_lon, region)
+    
+    return features[RISK_FEATURES].values, labels
+
+def train_tsunami_model(df):
+    """Fit the region risk classifier; None if data lacks both classes"""
+    global tsunami_model, scaler
+    
+    if df.empty or "latitude" not in df.columns or "longitude" not in df.columns:
+        return None
+    
+    X, y = training_set(df)
+    # Both classes must reach the training and the held-out split
+    if len(X) < 20 or y.min() == y.max() or np.bincount(y).min() < 2:
+        return None
+    
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
+    scaler = StandardScaler().fit(X_train)
+    tsunami_model = GradientBoostingClassifier(n_estimators=100, max_depth=3, random_state=42)
+    tsunami_model.fit(scaler.transform(X_train), y_train)
+    
+    model_path.parent.mkdir(exist_ok=True)
+    with open(model_path, "wb") as f:
+        pickle.dump(tsunami_model, f)
+    with open(scaler_path, "wb") as f:
+        pickle.dump(scaler, f)
+    
+    risk_cache.clear()
+    return {
+        "train_accuracy": round(tsunami_model.score(scaler.transform(X_train), y_train), 3),
+        "test_accuracy": round(tsunami_model.score(scaler.transform(X_test), y_test), 3),
+        # Accuracy of always predicting the more common class on the same held-out cells
+        "majority_accuracy": round(max(y_test.mean(), 1 - y_test.mean()), 3),
+        "cells": len(X),
+        "test_cells": len(X_test),
+        "exposed_cells": int(y.sum())
+    }
+
+def load_tsunami_model():
+    global tsunami_model, scaler
+    
+    if model_path.exists() and scaler_path.exists():
+        with open(model_path, "rb") as f:
+            tsunami_model = pickle.load(f)
+        with open(scaler_path, "rb") as f:
+            scaler = pickle.load(f)
+        return True
+    return False
+
+def analyze_tsunami_risk_by_region(df, method="model"):
+    """Analyze tsunami risk for different geographic regions.
+
+    method="model" scores every cell the model was trained on in one
+    predict_proba call and gives each region the mean of its cells' scores,
+    weighted by the region's rows in each cell, so training and scoring use
+    the same unit (falling back to thresholds if no model is trained);
+    method="threshold" is the hand-tuned baseline. Results are cached per
+    dataset generation.
+    """
     if df.empty or "latitude" not in df.columns or "longitude" not in df.columns:
         return []
     
-    regions = [
-        {"name": "Alaska Coast", "lat_range": (51, 71), "lon_range": (-180, -130), "base_risk": 25},
-        {"name": "Pacific Northwest (Canada/USA)", "lat_range": (42, 60), "lon_range": (-135, -122), "base_risk": 20},
-        {"name": "Japan Coast", "lat_range": (30, 46), "lon_range": (129, 146), "base_risk": 30},
-        {"name": "Indonesia Region", "lat_range": (-11, 6), "lon_range": (95, 141), "base_risk": 35},
-        {"name": "Chile Coast", "lat_range": (-56, -17), "lon_range": (-76, -66), "base_risk": 28},
-        {"name": "New Zealand", "lat_range": (-47, -34), "lon_range": (166, 179), "base_risk": 22},
-        {"name": "Philippines", "lat_range": (5, 21), "lon_range": (117, 127), "base_risk": 30},
-        {"name": "Peru Coast", "lat_range": (-18, -1), "lon_range": (-82, -70), "base_risk": 25},
-        {"name": "Aleutian Islands", "lat_range": (51, 55), "lon_range": (-180, -160), "base_risk": 27},
-        {"name": "Caribbean", "lat_range": (10, 27), "lon_range": (-85, -60), "base_risk": 18}
-    ]
+    if method == "model" and tsunami_model is None:
+        method = "threshold"
+    
+    # A frame of the same generation and length is the whole dataset
+    cache_key = (df.attrs.get("generation"), len(df), method)
+    if cache_key[0] is not None and cache_key in risk_cache:
+        return risk_cache[cache_key]
+    
+    regions = []
+    region_masks = []
+    region_frames = []
+    for region in region_registry.group("tsunami"):
+        mask = region_registry.mask(df, region["key"])
+        region_df = df[mask]
+        if len(region_df) > 10:
+            regions.append(region)
+            region_masks.append(mask)
+            region_frames.append(region_df)
+    
+    if not regions:
+        return []
+    
+    baseline_risk = np.array([calculate_tsunami_risk_score(region_df) for region_df in region_frames])
+    if method == "model":
+        groups = cell_groups(df)
+        cells = cell_features(df, groups)
+        cell_risk = tsunami_model.predict_proba(scaler.transform(cells[RISK_FEATURES].values))[:, 1] * 100
+        data_risk = baseline_risk.astype(float)
+        for i, mask in enumerate(region_masks):
+            region_cells, rows = np.unique(groups[mask], return_counts=True)
+            scored = np.isin(region_cells, cells.index.values)
+            # Regions without a cell dense enough to score keep the baseline
+            if scored.any():
+                positions = cells.index.get_indexer(region_cells[scored])
+                data_risk[i] = np.average(cell_risk[positions], weights=rows[scored])
+    else:
+        data_risk = baseline_risk
     
     risk_results = []
     
-    for region in regions:
-        region_df = df[
-            (df["latitude"] >= region["lat_range"][0]) & 
-            (df["latitude"] <= region["lat_range"][1]) &
-            (df["longitude"] >= region["lon_range"][0]) & 
-            (df["longitude"] <= region["lon_range"][1])
-        ]
+    for region, region_df, risk, baseline in zip(regions, region_frames, data_risk, baseline_risk):
+        total_risk = (region["base_risk"] + risk) / 2
         
-        if len(region_df) > 10:
-            data_risk = calculate_tsunami_risk_score(region_df)
-            total_risk = (region["base_risk"] + data_risk) / 2
-            
-            # Calculate confidence based on data availability
-            confidence = min(len(region_df) / 100, 1.0) * 100
-            
-            risk_results.append({
-                "region": region["name"],
-                "risk_score": round(total_risk, 1),
-                "confidence": round(confidence, 1),
-                "data_points": len(region_df),
-                "indicators": {
-                    "pressure_anomaly": round(region_df["pressure"].std(), 2) if "pressure" in region_df.columns else 0,
-                    "temp_variation": round(region_df["temperature"].std(), 2) if "temperature" in region_df.columns else 0,
-                    "salinity_variation": round(region_df["salinity"].std(), 2) if "salinity" in region_df.columns else 0
-                }
-            })
+        # Calculate confidence based on data availability
+        confidence = min(len(region_df) / 100, 1.0) * 100
+        
+        risk_results.append({
+            "region": region["name"],
+            "risk_score": round(total_risk, 1),
+            "baseline_risk_score": round((region["base_risk"] + baseline) / 2, 1),
+            "method": method,
+            "confidence": round(confidence, 1),
+            "data_points": len(region_df),
+            "indicators": {
+                "pressure_anomaly": round(region_df["pressure"].std(), 2) if "pressure" in region_df.columns else 0,
+                "temp_variation": round(region_df["temperature"].std(), 2) if "temperature" in region_df.columns else 0,
+                "salinity_variation": round(region_df["salinity"].std(), 2) if "salinity" in region_df.columns else 0
+            }
+        })
     
     # Sort by risk score
     risk_results.sort(key=lambda x: x["risk_score"], reverse=True)
+    if cache_key[0] is not None:
+        risk_cache[cache_key] = risk_results
     return risk_results
 
 def predict_tsunami_timeframe(risk_score):
@@ -111,14 +251,15 @@ def predict_tsunami_timeframe(risk_score):
     else:
         return "Low risk - No immediate threat detected"
 
-def generate_tsunami_analysis(df, user_prompt):
+def generate_tsunami_analysis(df, user_prompt, method="model"):
     """Generate comprehensive tsunami risk analysis"""
-    risk_by_region = analyze_tsunami_risk_by_region(df)
+    risk_by_region = analyze_tsunami_risk_by_region(df, method)
     
     if not risk_by_region:
         return {
             "summary": "Insufficient data to perform tsunami risk analysis. Need geographic coverage of high-risk coastal regions.",
             "top_risks": [],
+            "all_regions": [],
             "recommendations": []
         }
     
@@ -156,5 +297,6 @@ def generate_tsunami_analysis(df, user_prompt):
         "top_risks": risk_by_region[:5],
         "all_regions": risk_by_region,
         "recommendations": recommendations,
+        "method": risk_by_region[0]["method"],
         "analysis_date": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
     }
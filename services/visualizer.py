@@ -1,9 +1,35 @@
+import base64
 import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 import numpy as np
+from services.sample_pyramid import sample_pyramid
+from services.derived import variable_label, variable_unit
 
-def temperature_depth_plot(df: pd.DataFrame):
+CHART_FORMATS = ["plotly", "compact"]
+# Most rows a chart plots; larger selections are thinned through the sample pyramid
+DEPTH_PLOT_POINTS = 1000
+HEATMAP_POINTS = 2000
+
+def encode_array(values, dtype="float32"):
+    """Typed array as base64 of its little-endian bytes (decode with e.g. new Float32Array(buffer))"""
+    array = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": dtype, "length": int(len(array)), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+def compact_chart(chart_type, columns, layout, hover=None):
+    """Chart as typed column buffers plus a small layout spec; the client builds traces and hover text"""
+    return {
+        "format": "compact",
+        "type": chart_type,
+        "columns": {
+            name: encode_array(values, "int32" if np.issubdtype(np.asarray(values).dtype, np.integer) else "float32")
+            for name, values in columns.items()
+        },
+        "layout": layout,
+        "hover": hover
+    }
+
+def temperature_depth_plot(df: pd.DataFrame, chart_format="plotly"):
     """Generate variable vs depth plot"""
     if df.empty or "pressure" not in df.columns:
         return None
@@ -12,8 +38,20 @@ def temperature_depth_plot(df: pd.DataFrame):
     if variable not in df.columns:
         return None
     
-    # Sample data if too large
-    plot_df = df.sample(min(1000, len(df))) if len(df) > 1000 else df
+    # Spatially thinned whole profiles, the same ones on every request
+    plot_df = sample_pyramid.sample(df, DEPTH_PLOT_POINTS)
+    
+    title = f"{variable.capitalize()} vs Depth Profile"
+    xaxis_title = f"{variable.capitalize()} ({'°C' if variable == 'temperature' else 'PSU'})"
+    
+    if chart_format == "compact":
+        return compact_chart(
+            "scatter",
+            {"x": plot_df[variable].values, "y": plot_df["pressure"].values},
+            {"title": title, "xaxis_title": xaxis_title, "yaxis_title": "Depth (dbar)", "yaxis_reversed": True,
+             "colorscale": "Viridis", "color": "x", "colorbar_title": variable.capitalize(), "height": 450},
+            hover=f"{variable}: {{x:.2f}}<br>Depth: {{y:.0f}} dbar"
+        )
     
     fig = go.Figure()
     fig.add_trace(go.Scatter(
@@ -33,8 +71,8 @@ def temperature_depth_plot(df: pd.DataFrame):
     ))
     
     fig.update_layout(
-        title=f"{variable.capitalize()} vs Depth Profile",
-        xaxis_title=f"{variable.capitalize()} ({'°C' if variable == 'temperature' else 'PSU'})",
+        title=title,
+        xaxis_title=xaxis_title,
         yaxis_title="Depth (dbar)",
         yaxis=dict(autorange="reversed"),
         height=450,
@@ -44,7 +82,7 @@ def temperature_depth_plot(df: pd.DataFrame):
     
     return fig.to_json()
 
-def generate_heatmap(df: pd.DataFrame, variable: str):
+def generate_heatmap(df: pd.DataFrame, variable: str, chart_format="plotly"):
     """Generate geographic heatmap"""
     if df.empty or variable not in df.columns:
         return None
@@ -52,8 +90,8 @@ def generate_heatmap(df: pd.DataFrame, variable: str):
     if "latitude" not in df.columns or "longitude" not in df.columns:
         return None
     
-    # Sample for performance
-    plot_df = df.sample(min(2000, len(df))) if len(df) > 2000 else df
+    # Spatially thinned sample for performance, stable across requests
+    plot_df = sample_pyramid.sample(df, HEATMAP_POINTS).copy()
     
     # Create grid for heatmap
     lat_bins = np.linspace(plot_df["latitude"].min(), plot_df["latitude"].max(), 30)
@@ -66,6 +104,18 @@ def generate_heatmap(df: pd.DataFrame, variable: str):
     heatmap_data['lat'] = heatmap_data['lat_bin'].apply(lambda x: x.mid)
     heatmap_data['lon'] = heatmap_data['lon_bin'].apply(lambda x: x.mid)
     
+    if chart_format == "compact":
+        cells = heatmap_data.dropna(subset=[variable])
+        return compact_chart(
+            "scattermapbox",
+            {"lat": cells['lat'].astype(float).values, "lon": cells['lon'].astype(float).values, "value": cells[variable].values},
+            {"title": f"{variable.capitalize()} Geographic Distribution", "mapbox_style": "open-street-map",
+             "center": {"lat": float(plot_df["latitude"].mean()), "lon": float(plot_df["longitude"].mean())}, "zoom": 2,
+             "colorscale": 'RdYlBu_r' if variable == 'temperature' else 'Viridis', "color": "value",
+             "colorbar_title": variable.capitalize(), "marker_size": 15, "opacity": 0.7, "height": 450},
+            hover=f"Lat: {{lat:.2f}}<br>Lon: {{lon:.2f}}<br>{variable}: {{value:.2f}}"
+        )
+    
     fig = go.Figure(go.Scattermapbox(
         lat=heatmap_data['lat'],
         lon=heatmap_data['lon'],
@@ -95,16 +145,31 @@ def generate_heatmap(df: pd.DataFrame, variable: str):
     
     return fig.to_json()
 
-def generate_probability_distribution(df: pd.DataFrame, variable: str):
+def generate_probability_distribution(df: pd.DataFrame, variable: str, median=None, chart_format="plotly"):
     """Generate probability distribution histogram"""
     if df.empty or variable not in df.columns:
         return None
     
-    # Calculate statistics
+    # Calculate statistics (reuse a precomputed median to avoid another sort)
     mean_val = df[variable].mean()
-    median_val = df[variable].median()
+    median_val = df[variable].median() if median is None else median
     std_val = df[variable].std()
     
+    title = f"{variable_label(variable).capitalize()} Distribution (σ={std_val:.2f})"
+    xaxis_title = f"{variable_label(variable).capitalize()} ({variable_unit(variable)})"
+    
+    if chart_format == "compact":
+        # Pre-binned: the payload is 50 counts instead of every value
+        counts, edges = np.histogram(df[variable].values, bins=50)
+        return compact_chart(
+            "histogram",
+            {"edges": edges, "counts": counts},
+            {"title": title, "xaxis_title": xaxis_title, "yaxis_title": "Frequency", "height": 350,
+             "marker_color": "#3b82f6", "opacity": 0.7, "bargap": 0.1,
+             "mean": round(float(mean_val), 2), "median": round(float(median_val), 2), "std": round(float(std_val), 2)},
+            hover="Value: {x:.2f}<br>Count: {y}"
+        )
+    
     fig = go.Figure()
     
     # Histogram
@@ -126,8 +191,8 @@ def generate_probability_distribution(df: pd.DataFrame, variable: str):
                   annotation_text=f"Median: {median_val:.2f}", annotation_position="bottom")
     
     fig.update_layout(
-        title=f"{variable.capitalize()} Distribution (σ={std_val:.2f})",
-        xaxis_title=f"{variable.capitalize()} ({'°C' if variable == 'temperature' else 'PSU'})",
+        title=title,
+        xaxis_title=xaxis_title,
         yaxis_title="Frequency",
         height=350,
         template="plotly_white",
@@ -0,0 +1,60 @@
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Offloaded work runs in the test process
+os.environ.setdefault("OFFLOAD_WORKERS", "0")
+
+SYNTHETIC_PRESSURES = np.array([5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 400, 500, 700, 1000, 1500, 2000], dtype=float)
+
+def synthetic_argo(n_profiles=600, seed=0):
+    """Shuffled ARGO-like rows: profiles at random positions with a warm, fresh surface layer"""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(-75, 75, n_profiles)
+    lon = rng.uniform(-180, 180, n_profiles)
+    times = pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.uniform(0, 365 * 10, n_profiles), unit="D")
+    parts = []
+    for i in range(n_profiles):
+        k = rng.integers(8, len(SYNTHETIC_PRESSURES) + 1)
+        pressure = SYNTHETIC_PRESSURES[:k] + rng.normal(0, 1, k).clip(-2, 2)
+        surface = 28 - abs(lat[i]) * 0.35
+        parts.append(pd.DataFrame({
+            "time": times[i],
+            "latitude": lat[i],
+            "longitude": lon[i],
+            "pressure": pressure,
+            "temperature": 2 + (surface - 2) * np.exp(-pressure / 400) + rng.normal(0, 0.2, k),
+            "salinity": 34.5 + 0.5 * np.exp(-pressure / 300) + rng.normal(0, 0.05, k),
+            "platform_number": 1900000 + i % 150,
+            "cycle_number": i
+        }))
+    return pd.concat(parts, ignore_index=True).sample(frac=1, random_state=seed)
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """app.api started on a synthetic dataset: the startup load, indexes and model training run at import"""
+    directory = tmp_path_factory.mktemp("argo")
+    (directory / "data").mkdir()
+    synthetic_argo().to_parquet(directory / "data" / "argo_clean.parquet")
+
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        import app.api as api
+    finally:
+        os.chdir(cwd)
+    return api
+
+@pytest.fixture(scope="session")
+def dataset(api):
+    return api.df
+
+@pytest.fixture(scope="session")
+def client(api):
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from services.admission import AdmissionController, Overloaded
+
+def controller():
+    return AdmissionController({"slow": {"concurrency": 1, "max_queue": 1, "max_wait": 0.2}})
+
+def test_queued_request_gets_released_slot():
+    async def scenario():
+        admission = controller()
+        await admission.acquire("slow")
+        waiting = asyncio.create_task(admission.acquire("slow"))
+        await asyncio.sleep(0)
+        # Queue full: the next request is shed without waiting
+        with pytest.raises(Overloaded):
+            await admission.acquire("slow")
+        admission.release("slow")
+        await waiting
+        stats = admission.stats()["slow"]
+        assert stats["active"] == 1 and stats["queued"] == 0 and stats["shed"] == 1
+    asyncio.run(scenario())
+
+def test_wait_budget_and_no_wait():
+    async def scenario():
+        admission = controller()
+        await admission.acquire("slow")
+        with pytest.raises(Overloaded):
+            await admission.acquire("slow", wait=False)
+        with pytest.raises(Overloaded):
+            await admission.acquire("slow")
+        admission.release("slow")
+        assert admission.stats()["slow"]["active"] == 0
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        admission = controller()
+        await admission.acquire("slow")
+        waiting = asyncio.create_task(admission.acquire("slow"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        admission.release("slow")
+        assert admission.stats()["slow"]["active"] == 0
+    asyncio.run(scenario())
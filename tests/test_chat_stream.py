@@ -0,0 +1,49 @@
+import asyncio
+import json
+import pytest
+from services.result_cache import result_cache
+
+def stream_events(client, prompt):
+    response = client.post("/chat/stream", json={"prompt": prompt, "session_id": "stream-test"})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+def test_visualization_prompt_streams_every_block(client):
+    result_cache.clear()
+    events = stream_events(client, "show a temperature chart in the pacific")
+    names = [event["event"] for event in events]
+    assert names[0] == "summary" and names[-1] == "done"
+    assert "error" not in names
+    for name in ["probabilities", "issues", "location_insights", "time_series", "chart", "heatmap", "probability_distribution"]:
+        assert name in names
+    distribution = next(event for event in events if event["event"] == "probability_distribution")
+    assert distribution["data"] is not None
+
+def test_failed_block_ends_stream_with_error(client, api, monkeypatch):
+    result_cache.clear()
+    def fail(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(api, "analyze_anomalies", fail)
+    events = stream_events(client, "show a temperature heatmap in the atlantic")
+    names = [event["event"] for event in events]
+    assert names[-2:] == ["error", "done"]
+    assert events[-2]["block"] == "issues"
+    assert "issues" not in names
+    # Nothing partial was cached, so the next request computes again
+    monkeypatch.undo()
+    assert "issues" in [event["event"] for event in stream_events(client, "show a temperature heatmap in the atlantic")]
+
+def test_slot_is_released_when_the_client_leaves_before_the_body(api):
+    async def scenario():
+        request = api.ChatRequest(prompt="show a temperature chart in the indian ocean", session_id="gone")
+        response = await api.chat_stream(request, chart_format=None, accept=None)
+        assert api.admission.stats()["visualization"]["active"] == 1
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+        async def send(message):
+            raise OSError("client disconnected")
+        with pytest.raises(OSError):
+            await response({"type": "http"}, receive, send)
+        assert api.admission.stats()["visualization"]["active"] == 0
+    asyncio.run(scenario())
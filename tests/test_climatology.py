@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from services.climatology import CellClimatology, cell_ids, CLIMATOLOGY_VARIABLES
+
+def test_batched_updates_match_one_pass_moments():
+    rng = np.random.default_rng(2)
+    n = 5000
+    df = pd.DataFrame({
+        "latitude": rng.uniform(-20, 20, n),
+        "longitude": rng.uniform(40, 80, n),
+        "pressure": rng.uniform(0, 1500, n),
+        "temperature": rng.normal(12, 4, n),
+        "salinity": rng.normal(35, 0.3, n)
+    })
+    climatology = CellClimatology()
+    for start, end in [(0, 700), (700, 701), (701, 3000), (3000, n)]:
+        climatology.update(df.iloc[start:end])
+
+    cells = cell_ids(df)
+    counts = np.bincount(cells, minlength=len(climatology.count))
+    np.testing.assert_array_equal(climatology.count, counts)
+    seen = np.flatnonzero(counts)
+    for variable in CLIMATOLOGY_VARIABLES:
+        grouped = df[variable].groupby(cells)
+        np.testing.assert_allclose(climatology.mean[variable][seen], grouped.mean().loc[seen].values)
+        np.testing.assert_allclose(climatology.m2[variable][seen], (grouped.var(ddof=0) * grouped.size()).loc[seen].values, atol=1e-8)
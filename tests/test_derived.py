@@ -0,0 +1,16 @@
+import pytest
+from services.derived import DERIVED_VARIABLES, extract_conditions
+from services.external_ai import is_oceanographic_query
+
+def test_attached_dataset_has_every_derived_column(dataset):
+    for name in DERIVED_VARIABLES:
+        assert name in dataset.columns
+
+@pytest.mark.parametrize("prompt", ["density above 1027.5", "mixed layer deeper than 100", "thermocline in the pacific", "mld in 2022"])
+def test_derived_variable_prompts_are_oceanographic(prompt):
+    assert is_oceanographic_query(prompt)
+
+def test_extract_conditions():
+    assert extract_conditions("density above 1027.5 and mixed layer deeper than 100") == (
+        ("mixed_layer_depth", ">", 100.0), ("potential_density", ">", 1027.5)
+    )
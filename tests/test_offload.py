@@ -0,0 +1,24 @@
+import numpy as np
+from services.offload import Offloader
+from services.query_engine import parse_prompt, filter_data
+
+def offloader_for(df, directory):
+    offloader = Offloader(workers=0)
+    offloader.df = df
+    offloader.manifest = {"directory": str(directory), "generation": df.attrs.get("generation")}
+    return offloader
+
+def test_dataset_slices_travel_as_positions(dataset, tmp_path):
+    rows = filter_data(dataset, parse_prompt("temperature in the indian ocean"))
+    positions = offloader_for(dataset, tmp_path).rows(rows)
+    assert isinstance(positions, np.ndarray)
+    assert dataset.iloc[positions].equals(rows)
+
+def test_other_frames_travel_whole(dataset, tmp_path):
+    offloader = offloader_for(dataset, tmp_path)
+    level_rows = filter_data(dataset, parse_prompt("temperature at 500 m in the pacific"))
+    assert offloader.rows(level_rows) is level_rows
+
+    # attrs survive the copy, but the rows no longer match the dataset
+    shifted = dataset.iloc[:100].assign(pressure=lambda frame: frame["pressure"] + 1)
+    assert offloader.rows(shifted) is shifted
@@ -0,0 +1,18 @@
+import numpy as np
+from services.profiles import profile_gradient, segment_starts, segment_mean
+
+def test_profile_gradient_matches_np_gradient_within_profiles():
+    rng = np.random.default_rng(3)
+    lengths = rng.integers(1, 9, 50)
+    profile_ids = np.repeat(np.arange(len(lengths)), lengths)
+    values = rng.normal(0, 1, len(profile_ids))
+    result = profile_gradient(values, profile_ids)
+    offsets = np.append(segment_starts(profile_ids), len(values))
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        expected = np.gradient(values[start:end]) if end - start > 1 else np.zeros(1)
+        np.testing.assert_allclose(result[start:end], expected)
+
+def test_segment_mean():
+    profile_ids = np.array([0, 0, 1, 2, 2, 2])
+    values = np.array([1.0, 3.0, 5.0, 2.0, 4.0, 6.0])
+    np.testing.assert_allclose(segment_mean(values, profile_ids), [2.0, 5.0, 4.0])
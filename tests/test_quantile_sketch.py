@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from services.quantile_sketch import quantile_sketches, SKETCH_SIZE, PERCENTILES
+
+@pytest.mark.parametrize("query", [{}, {"max_depth": 50}, {"min_depth": 500}])
+def test_percentiles_within_rank_error_bound(dataset, query):
+    estimate = quantile_sketches.estimate("temperature", query)
+    pressure = dataset["pressure"].values
+    selected = np.ones(len(dataset), dtype=bool)
+    if "max_depth" in query:
+        selected &= pressure < query["max_depth"]
+    if "min_depth" in query:
+        selected &= pressure >= query["min_depth"]
+    values = np.sort(dataset["temperature"].values[selected])
+
+    bound = 1 / (2 * SKETCH_SIZE)
+    for q, name in zip(PERCENTILES, ["p10", "p25", "median", "p75", "p90"]):
+        # Estimates are rounded to 0.01, so compare against the ranks of that whole interval
+        lo = np.searchsorted(values, estimate[name] - 0.005, side="left") / len(values)
+        hi = np.searchsorted(values, estimate[name] + 0.005, side="right") / len(values)
+        assert lo - bound <= q / 100 <= hi + bound
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+from services.query_engine import extract_time_window, parse_prompt, compile_query, filter_data, filter_batch
+
+NOW = pd.Timestamp("2025-06-15")
+
+@pytest.mark.parametrize("prompt", [
+    "temperature at 2000 m",
+    "temperature between 1000 and 2000 m",
+    "salinity at 1975 dbar",
+    "mixed layer deeper than 2000"
+])
+def test_measurements_are_not_years(prompt):
+    assert extract_time_window(prompt, NOW) == (None, None)
+
+@pytest.mark.parametrize("prompt, window", [
+    ("temperature in 2023", (pd.Timestamp("2023-01-01"), pd.Timestamp("2024-01-01"))),
+    ("temperature at 2000 m since 2020", (pd.Timestamp("2020-01-01"), None)),
+    ("salinity between 2019 and 2021", (pd.Timestamp("2019-01-01"), pd.Timestamp("2022-01-01"))),
+    ("temperature over the last 5 years", (NOW - pd.DateOffset(years=5), None))
+])
+def test_time_windows(prompt, window):
+    assert extract_time_window(prompt, NOW) == window
+
+def test_standard_depth_query_has_no_time_window():
+    query = parse_prompt("temperature at 2000 m")
+    assert query["level"] == 2000.0
+    assert query["start_time"] is None and query["end_time"] is None
+
+@pytest.mark.parametrize("variable", ["time", "profile_id", "temperature_z"])
+def test_structured_queries_only_take_oceanographic_variables(variable):
+    with pytest.raises(ValueError):
+        compile_query({"variables": [variable], "aggregations": ["mean"]})
+
+def test_structured_query_accepts_derived_variables():
+    query = compile_query({"variables": ["potential_density"], "conditions": [{"variable": "depth", "op": ">", "value": 100}], "aggregations": ["mean"]})
+    assert query["variable"] == "potential_density" and query["conditions"] == (("depth", ">", 100.0),)
+
+def test_filter_batch_matches_filter_data(dataset):
+    prompts = [
+        "temperature in the pacific since 2020",
+        "deep salinity in the indian ocean",
+        "surface temperature lat 10 to 30 lon 60 to 90",
+        "temperature between 200 and 500 m in 2018",
+        "salinity in the pacific since 2020 below 35",
+        "temperature at 500 m in the pacific",
+        "temperature in the pacific"
+    ]
+    queries = [parse_prompt(prompt) for prompt in prompts]
+    for batched, query in zip(filter_batch(dataset, queries), queries):
+        assert batched.equals(filter_data(dataset, query))
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from services.query_engine import parse_prompt, query_predicates, predicate_mask, plan_query
+
+PROMPTS = [
+    "temperature in the pacific since 2020",
+    "deep salinity in the indian ocean",
+    "surface temperature lat 10 to 30 lon 60 to 90",
+    "density above 1027 in the atlantic",
+    "temperature between 200 and 500 m in 2018",
+    "mixed layer deeper than 50 in the southern ocean",
+    "temperature 10s to 10n, 170e to 170w",
+    "salinity in the pacific since 2020 below 35"
+]
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_planner_matches_conjunction_of_predicate_masks(dataset, prompt):
+    query = parse_prompt(prompt)
+    predicates = query_predicates(query)
+    assert predicates
+    expected = np.logical_and.reduce([predicate_mask(dataset, predicate) for predicate in predicates])
+    rows, plan = plan_query(dataset, query)
+    np.testing.assert_array_equal(rows.index.values, np.flatnonzero(expected))
+    assert plan[-1]["rows_out"] == len(rows)
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import pytest
+from services.single_flight import SingleFlight
+
+def test_followers_wait_on_the_event_loop():
+    async def scenario():
+        flight = SingleFlight()
+        assert flight.follow("key") is None
+
+        started, release = threading.Event(), threading.Event()
+        def slow():
+            started.set()
+            release.wait()
+            return 42
+
+        leader = asyncio.create_task(asyncio.to_thread(flight.do, "key", slow))
+        await asyncio.to_thread(started.wait)
+        followers = [flight.follow("key") for _ in range(50)]
+        assert all(follower is not None for follower in followers)
+        release.set()
+        assert await leader == 42
+        assert await asyncio.gather(*followers) == [42] * 50
+        # The flight is over: the next caller computes again
+        assert flight.follow("key") is None
+        assert flight.stats()["coalesced"] == 50
+    asyncio.run(scenario())
+
+def test_followers_get_the_leaders_error_and_may_leave():
+    async def scenario():
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        def failing():
+            started.set()
+            release.wait()
+            raise ValueError("bad query")
+
+        leader = asyncio.create_task(asyncio.to_thread(flight.do, "key", failing))
+        await asyncio.to_thread(started.wait)
+        follower, leaving = flight.follow("key"), flight.follow("key")
+        leaving.cancel()
+        release.set()
+        with pytest.raises(ValueError):
+            await leader
+        with pytest.raises(ValueError):
+            await follower
+    asyncio.run(scenario())
@@ -0,0 +1,40 @@
+import numpy as np
+from services.query_engine import parse_prompt, filter_data
+from services.regions import region_registry, points_in_region
+from services.standard_levels import standard_levels, interpolate_profiles, STANDARD_LEVELS
+
+def test_level_frame_is_not_dataset_rows(dataset):
+    frame = standard_levels.level_frame(500.0)
+    assert frame.attrs.get("generation") is None
+    assert (frame["pressure"] == 500.0).all()
+
+def test_level_query_with_region_matches_points_in_region(dataset):
+    query = parse_prompt("temperature at 500 m in the pacific")
+    assert query["level"] == 500.0 and query["region"] is not None
+
+    rows = filter_data(dataset, query)
+    frame = standard_levels.level_frame(500.0)
+    inside = points_in_region(frame["latitude"].values, frame["longitude"].values, region_registry.get(query["region"]))
+    assert len(rows) == inside.sum() > 0
+    assert np.allclose(np.sort(rows["temperature"].values), np.sort(frame["temperature"].values[inside]))
+
+def test_level_frame_has_every_derived_column(dataset):
+    frame = standard_levels.level_frame(100.0)
+    for name in ["depth", "potential_density", "mixed_layer_depth", "thermocline_depth"]:
+        assert name in frame.columns
+    assert (frame["depth"] < frame["pressure"]).all()
+
+def test_interpolation_matches_np_interp_per_profile():
+    rng = np.random.default_rng(1)
+    # Candidate pressures include the standard levels, so some samples hit a level exactly
+    candidates = np.union1d(np.arange(1, 2100, 7), STANDARD_LEVELS).astype(float)
+    lengths = rng.integers(1, 12, 40)
+    offsets = np.append(0, np.cumsum(lengths))
+    pressure = np.concatenate([np.sort(rng.choice(candidates, n, replace=False)) for n in lengths])
+    values = rng.normal(10, 3, len(pressure))
+
+    result = interpolate_profiles(pressure, values, offsets, STANDARD_LEVELS)
+    for i in range(len(lengths)):
+        p, v = pressure[offsets[i]:offsets[i + 1]], values[offsets[i]:offsets[i + 1]]
+        expected = np.interp(STANDARD_LEVELS, p, v, left=np.nan, right=np.nan)
+        np.testing.assert_allclose(result[i], expected, equal_nan=True)
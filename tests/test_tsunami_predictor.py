@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from services import tsunami_predictor
+from services.regions import region_registry
+from services.tsunami_predictor import train_tsunami_model, analyze_tsunami_risk_by_region, cell_groups, cell_features, RISK_FEATURES
+
+@pytest.fixture
+def trained(dataset, tmp_path, monkeypatch):
+    monkeypatch.setattr(tsunami_predictor, "model_path", tmp_path / "tsunami_model.pkl")
+    monkeypatch.setattr(tsunami_predictor, "scaler_path", tmp_path / "tsunami_scaler.pkl")
+    metrics = train_tsunami_model(dataset)
+    assert metrics is not None
+    yield metrics
+    monkeypatch.setattr(tsunami_predictor, "tsunami_model", None)
+    monkeypatch.setattr(tsunami_predictor, "scaler", None)
+    tsunami_predictor.risk_cache.clear()
+
+def test_metrics_are_held_out(trained):
+    assert 0 < trained["test_cells"] < trained["cells"]
+    assert 0 <= trained["test_accuracy"] <= 1 and 0.5 <= trained["majority_accuracy"] <= 1
+
+def test_region_risk_is_mean_of_cell_predictions(dataset, trained):
+    groups = cell_groups(dataset)
+    cells = cell_features(dataset, groups)
+    cell_risk = dict(zip(cells.index, tsunami_predictor.tsunami_model.predict_proba(
+        tsunami_predictor.scaler.transform(cells[RISK_FEATURES].values))[:, 1] * 100))
+
+    checked = 0
+    for result in analyze_tsunami_risk_by_region(dataset, "model"):
+        region = next(region for region in region_registry.group("tsunami") if region["name"] == result["region"])
+        region_groups = groups[region_registry.mask(dataset, region["key"])]
+        scored = [cell_risk[group] for group in region_groups if group in cell_risk]
+        if scored:
+            assert result["risk_score"] == pytest.approx((region["base_risk"] + np.mean(scored)) / 2, abs=0.05)
+            checked += 1
+    assert checked > 0